@@ -2,15 +2,21 @@ from collections.abc import AsyncIterable
 from typing import Any
 from langchain_core.messages import AIMessage, ToolMessage
 from langchain_core.tools import tool
-from langgraph.checkpoint.memory import MemorySaver
 from langgraph.prebuilt import create_react_agent
 from modules.fuse_config import FuseConfig
 from modules.oci_client import LLM_Client
+from modules.bounded_saver import BoundedMemorySaver
+from modules.history_policy import HistoryPolicy
+from modules.sqlite_store import SQLiteCheckpointSaver, SQLiteDatabase
 
 oci_client = LLM_Client()
 fuse_handler = FuseConfig()
 id = fuse_handler.generate_id()
-memory = MemorySaver()
+storage_settings = oci_client.settings.storage
+if storage_settings.backend == "sqlite":
+    memory = SQLiteCheckpointSaver(SQLiteDatabase.open(storage_settings), **oci_client.settings.checkpointer)
+else:
+    memory = BoundedMemorySaver(**oci_client.settings.checkpointer)
 
 @tool
 def find_word(word:str)->str:
@@ -28,24 +34,44 @@ class ArtAgent:
     )
 
     def __init__(self):
-        self.model = oci_client.build_llm_client()
+        self.model = oci_client.build_tiered_client()
+        self.history = HistoryPolicy(summary_model=self.model,**oci_client.settings.history)
         self.tools = [find_word]
         self.art_agent = create_react_agent(
             model=self.model,
             tools=self.tools,
             checkpointer=memory,
-            prompt=self.SYSTEM_INSTRUCTION
+            prompt=self.SYSTEM_INSTRUCTION,
+            pre_model_hook=self.history.trim
         )
 
-    async def stream(self,query,context_id)-> AsyncIterable[dict[str,Any]]:
+    async def stream(self,query,context_id,token_stream:bool=False)-> AsyncIterable[dict[str,Any]]:
         inputs = {'messages': [('user', query)]}
         config = {'configurable': {'thread_id': context_id},'callbacks':[fuse_handler.get_handler()],'metadata':{'langfuse_session_id':id}}
+        stream_mode = ["messages","values"] if token_stream else ["values"]
         final_response = []
         try:
-            for chunk in self.art_agent.stream(inputs,config,stream_mode="values"):
+            async for mode, chunk in self.art_agent.astream(inputs,config,stream_mode=stream_mode):
+                if mode == "messages":
+                    token, metadata = chunk
+                    # Only the text the model writes for the user, tool call arguments are skipped
+                    if (
+                        metadata.get('langgraph_node') == 'agent'
+                        and isinstance(token.content,str) and token.content
+                        and not getattr(token,'tool_call_chunks',None)
+                        and not getattr(token,'tool_calls',None)
+                    ):
+                        yield {
+                            'is_task_complete': False,
+                            'require_user_input': False,
+                            'is_token': True,
+                            'message_id': token.id,
+                            'content': token.content,
+                        }
+                    continue
                 message = chunk['messages'][-1]
                 final_response.append(message.content)
-                if isinstance(message,AIMessage):
+                if isinstance(message,AIMessage) and not token_stream:
                     yield {
                         'is_task_complete': False,
                         'require_user_input': False,
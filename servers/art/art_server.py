@@ -1,4 +1,6 @@
-import click, httpx,uvicorn,logging,sys
+import click,uvicorn,logging,sys,asyncio,os
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
 from a2a.types import (
     AgentCapabilities,
     AgentCard,
@@ -9,53 +11,144 @@ from a2a.server.tasks import (
     InMemoryPushNotificationConfigStore,
     InMemoryTaskStore,
 )
-from a2a.server.apps import A2AStarletteApplication
-from a2a.server.request_handlers import DefaultRequestHandler
-from agent import ArtAgent
+from agent import ArtAgent, memory
+from modules.oci_client import LLM_Client
+from modules.http_pool import HttpPoolManager
+from modules.card_app import CachedCardApplication
+from modules.admission import AdmissionController
+from modules.cancel_handler import CancellingRequestHandler, RequestContextBuilder
+from modules.server_metrics import ServerMetrics
+from modules.status_policy import StatusUpdatePolicy
+from modules.sqlite_store import SQLiteDatabase, SQLitePushNotificationConfigStore, SQLiteTaskStore, run_retention
 from agent_executor import ArtAgentExecutor
 
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+def build_lifespan(llm_workers:int, database:SQLiteDatabase|None=None, stores:list|None=None, storage=None):
+    """ Starts the bounded LLM executor where the blocking OCI client runs during astream,
+    the loop default executor stays free for the other blocking work.
+    With a database it also runs the retention job and flushes pending writes on shutdown,
+    the shared HTTP pool is closed on shutdown """
+    @asynccontextmanager
+    async def lifespan(app):
+        executor = ThreadPoolExecutor(max_workers=llm_workers,thread_name_prefix="art-llm")
+        LLM_Client().executor = executor
+        logger.info(f'LLM executor started with {llm_workers} workers')
+        retention = None
+        if database:
+            retention = asyncio.create_task(
+                run_retention(database, stores or [], storage.retention_days * 86400, storage.compact_interval)
+            )
+        yield
+        if retention:
+            retention.cancel()
+            database.close()
+        await HttpPoolManager().aclose()
+        LLM_Client().executor = None
+        executor.shutdown(wait=False,cancel_futures=True)
+    return lifespan
+
+def build_app(host:str, port:int, llm_workers:int, workers:int=1):
+    """ Builds the A2A app of one server process, with several workers the task, push config
+    and checkpoint state is shared through the SQLite file """
+    settings = LLM_Client().settings
+    capabilities = AgentCapabilities(streaming=True,push_notifications=True)
+    skill = AgentSkill(
+        id="find_word",
+        name="Finds synonims for word to use in the poems",
+        description="Helps with finding alternative words for creative poems",
+        tags=["ideas","words"],
+        examples=["Find a synonim for bird"]
+    )
+    agent_card = AgentCard(
+        name="Art agent",
+        description="Helps user wirting poems and paragrpahs",
+        url=f"http://{host}:{port}/",
+        version="1.0.0",
+        default_input_modes=ArtAgent.SUPPORTED_CONTENT_TYPES,
+        default_output_modes=ArtAgent.SUPPORTED_CONTENT_TYPES,
+        capabilities=capabilities,
+        skills=[skill]
+    )
+
+    database = None
+    stores = []
+    if settings.storage.backend == "sqlite":
+        database = SQLiteDatabase.open(settings.storage)
+        # With several workers the other processes read and write the same file
+        database.shared = workers > 1
+        memory.shared = workers > 1
+        task_store = SQLiteTaskStore(database)
+        push_config_store = SQLitePushNotificationConfigStore(database)
+        stores = [task_store, push_config_store, memory]
+    else:
+        task_store = InMemoryTaskStore()
+        push_config_store = InMemoryPushNotificationConfigStore()
+
+    httpx_client = HttpPoolManager().client
+    push_sender = BasePushNotificationSender(httpx_client=httpx_client,config_store=push_config_store)
+    admission = AdmissionController(**settings.admission)
+    ServerMetrics().register('admission', admission.stats)
+    if LLM_Client().rate_limiter:
+        ServerMetrics().register('rate_limiter', LLM_Client().rate_limiter.stats)
+    request_handler = CancellingRequestHandler(
+        agent_executor=ArtAgentExecutor(
+            token_streaming=settings.agent_server.token_streaming,
+            status_policy=StatusUpdatePolicy(**settings.status_updates),
+        ),
+        task_store=task_store,
+        push_config_store=push_config_store,
+        push_sender= push_sender,
+        admission=admission,
+    )
+    # The agent built its tiered model with the executor
+    if LLM_Client().tiered:
+        ServerMetrics().register('model_tiers', LLM_Client().tiered.stats)
+    server = CachedCardApplication(
+        agent_card=agent_card, http_handler=request_handler, max_age=settings.agent_card.max_age,
+        context_builder=RequestContextBuilder(),
+    )
+
+    app = server.build(lifespan=build_lifespan(llm_workers,database,stores,settings.storage))
+    # Counters of this worker process only
+    app.add_route('/metrics', ServerMetrics().endpoint, methods=['GET'])
+    return app
+
+def create_app():
+    """ App factory run by every uvicorn worker process, main passes its options through the environment """
+    return build_app(
+        os.environ["AGENT_SERVER_HOST"],
+        int(os.environ["AGENT_SERVER_PORT"]),
+        int(os.environ["AGENT_SERVER_LLM_WORKERS"]),
+        int(os.environ["AGENT_SERVER_WORKERS"]),
+    )
+
 @click.command()
 @click.option("--host","host",default="localhost")
 @click.option("--port","port",default=9999)
-def main(host,port):
+@click.option("--llm-workers","llm_workers",default=None,type=int,help="Max concurrent blocking LLM calls per worker")
+@click.option("--workers","workers",default=None,type=int,help="Server processes sharing the port, above 1 needs the sqlite storage")
+def main(host,port,llm_workers,workers):
     try:
-        capabilities = AgentCapabilities(streaming=True,push_notifications=True)
-        skill = AgentSkill(
-            id="find_word",
-            name="Finds synonims for word to use in the poems",
-            description="Helps with finding alternative words for creative poems",
-            tags=["ideas","words"],
-            examples=["Find a synonim for bird"]
-        )
-        agent_card = AgentCard(
-            name="Art agent",
-            description="Helps user wirting poems and paragrpahs",
-            url=f"http://{host}:{port}/",
-            version="1.0.0",
-            default_input_modes=ArtAgent.SUPPORTED_CONTENT_TYPES,
-            default_output_modes=ArtAgent.SUPPORTED_CONTENT_TYPES,
-            capabilities=capabilities,
-            skills=[skill]
-        )
-
-        httpx_client = httpx.AsyncClient()
-        push_config_store = InMemoryPushNotificationConfigStore()
-        push_sender = BasePushNotificationSender(httpx_client=httpx_client,config_store=push_config_store)
-        request_handler = DefaultRequestHandler(
-            agent_executor=ArtAgentExecutor(),
-            task_store=InMemoryTaskStore(),
-            push_config_store=push_config_store,
-            push_sender= push_sender
-        )
-        server = A2AStarletteApplication(
-            agent_card=agent_card, http_handler=request_handler
-        )
-
-        uvicorn.run(server.build(), host=host, port=port)
+        settings = LLM_Client().settings
+        if llm_workers is None:
+            llm_workers = settings.agent_server.llm_workers
+        if workers is None:
+            workers = settings.agent_server.workers
+        if workers > 1:
+            if settings.storage.backend != "sqlite":
+                raise click.UsageError("--workers above 1 needs the sqlite storage backend to share the task state")
+            os.environ.update({
+                "AGENT_SERVER_HOST": host,
+                "AGENT_SERVER_PORT": str(port),
+                "AGENT_SERVER_LLM_WORKERS": str(llm_workers),
+                "AGENT_SERVER_WORKERS": str(workers),
+            })
+            uvicorn.run("art_server:create_app", factory=True, workers=workers, host=host, port=port)
+        else:
+            uvicorn.run(build_app(host,port,llm_workers), host=host, port=port)
 
     except Exception as e:
         logger.error(f'An error occurred during server startup: {e}')
@@ -0,0 +1,92 @@
+import asyncio
+import math
+import time
+from collections import Counter, deque
+from typing import Any
+from a2a.types import JSONRPCError
+from a2a.utils.errors import ServerError
+
+# Implementation defined JSON-RPC server error, the A2A errors use -32001 to -32007
+OVERLOADED_CODE = -32010
+
+class AdmissionController:
+    """ Caps the agent executions running at once, the others wait in a bounded queue
+
+    A request is rejected right away when the queue is full, or once it waited queue_timeout seconds.
+    The rejection is a JSON-RPC error with a retry_after hint, estimated from the queue length and
+    the average execution time. max_in_flight 0 turns the limit off.
+    """
+
+    def __init__(self, max_in_flight:int=8, max_queue:int=32, queue_timeout:float=10.0, samples:int=1000):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.slots = asyncio.Semaphore(max_in_flight or 1)
+        self.in_flight = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected:Counter = Counter()
+        self.waits:deque[float] = deque(maxlen=samples)
+        self.durations:deque[float] = deque(maxlen=samples)
+
+    def retry_after(self)->int:
+        """ Seconds until the queue ahead of a new request should have drained """
+        average = sum(self.durations) / len(self.durations) if self.durations else self.queue_timeout
+        return max(1, math.ceil((self.waiting + 1) / max(1, self.max_in_flight) * average))
+
+    def overloaded(self, reason:str)->ServerError:
+        self.rejected[reason] += 1
+        retry_after = self.retry_after()
+        return ServerError(error=JSONRPCError(
+            code=OVERLOADED_CODE,
+            message=f'Server overloaded ({reason}), retry in {retry_after}s',
+            data={'reason': reason, 'retry_after': retry_after},
+        ))
+
+    async def acquire(self)->float:
+        """ Waits for a free slot, returns the time the slot was taken or raises the overload error """
+        if not self.max_in_flight:
+            self.in_flight += 1
+            self.admitted += 1
+            return time.perf_counter()
+        if self.slots.locked() and self.waiting >= self.max_queue:
+            raise self.overloaded('queue_full')
+        queued = time.perf_counter()
+        self.waiting += 1
+        try:
+            async with asyncio.timeout(self.queue_timeout):
+                await self.slots.acquire()
+        except TimeoutError:
+            raise self.overloaded('queue_timeout') from None
+        finally:
+            self.waiting -= 1
+        admitted = time.perf_counter()
+        self.waits.append(admitted - queued)
+        self.in_flight += 1
+        self.admitted += 1
+        return admitted
+
+    def release(self, admitted:float):
+        self.in_flight -= 1
+        self.durations.append(time.perf_counter() - admitted)
+        if self.max_in_flight:
+            self.slots.release()
+
+    @staticmethod
+    def percentile(values:list[float], percent:float)->float:
+        return values[min(len(values) - 1, math.ceil(len(values) * percent / 100) - 1)] if values else 0.0
+
+    def stats(self)->dict[str,Any]:
+        waits = sorted(self.waits)
+        return {
+            'max_in_flight': self.max_in_flight,
+            'in_flight': self.in_flight,
+            'queue_depth': self.waiting,
+            'max_queue': self.max_queue,
+            'admitted': self.admitted,
+            'rejected': dict(self.rejected),
+            'wait_p50': round(self.percentile(waits, 50), 4),
+            'wait_p99': round(self.percentile(waits, 99), 4),
+            'wait_max': round(waits[-1], 4) if waits else 0.0,
+            'retry_after': self.retry_after(),
+        }
@@ -0,0 +1,44 @@
+import hashlib
+import time
+from email.utils import formatdate, parsedate_to_datetime
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from a2a.server.apps import A2AStarletteApplication
+
+class CachedCardApplication(A2AStarletteApplication):
+    """ A2A Starlette app that serves the agent card with ETag, Last-Modified and Cache-Control
+
+    Clients revalidate with If-None-Match / If-Modified-Since and get an empty 304 while the card is unchanged.
+    """
+
+    def __init__(self, *args, max_age:int=300, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.max_age = max_age
+        # The card does not change while the server runs, the body and validators are built once
+        self.card_response = JSONResponse(self.agent_card.model_dump(exclude_none=True, by_alias=True))
+        self.card_etag = f'"{hashlib.sha256(self.card_response.body).hexdigest()[:32]}"'
+        self.card_modified = int(time.time())
+        self.card_headers = {
+            'ETag': self.card_etag,
+            'Last-Modified': formatdate(self.card_modified, usegmt=True),
+            'Cache-Control': f'public, max-age={self.max_age}',
+        }
+        self.card_response.headers.update(self.card_headers)
+
+    def _not_modified(self, request:Request)->bool:
+        if_none_match = request.headers.get('if-none-match')
+        if if_none_match is not None:
+            # The ETag takes precedence over the date when both are sent
+            return self.card_etag in [tag.strip().removeprefix('W/') for tag in if_none_match.split(',')] or if_none_match.strip() == '*'
+        if_modified_since = request.headers.get('if-modified-since')
+        if if_modified_since is None:
+            return False
+        try:
+            return parsedate_to_datetime(if_modified_since).timestamp() >= self.card_modified
+        except (TypeError, ValueError):
+            return False
+
+    async def _handle_get_agent_card(self, request:Request)->Response:
+        if self._not_modified(request):
+            return Response(status_code=304, headers=self.card_headers)
+        return self.card_response
@@ -0,0 +1,145 @@
+import asyncio
+import importlib.util
+import logging
+from collections import Counter
+from typing import Any
+import httpx
+from modules.oci_client import LLM_Client
+
+logger = logging.getLogger(__name__)
+
+class _ReleasingStream(httpx.AsyncByteStream):
+    """ Response stream that frees the host slot once the body is closed """
+
+    def __init__(self, stream:httpx.AsyncByteStream, release):
+        self.stream = stream
+        self.release = release
+
+    async def __aiter__(self):
+        async for chunk in self.stream:
+            yield chunk
+
+    async def aclose(self):
+        try:
+            await self.stream.aclose()
+        finally:
+            self.release()
+
+class HostLimitedTransport(httpx.AsyncBaseTransport):
+    """ Caps the concurrent requests per host on top of the pooled transport and counts them
+
+    Card fetches and health probes (GET and HEAD) and requests sent with the extension host_slot=False
+    skip the cap, a host busy with long streams must still answer its probes and cancellations.
+    """
+
+    EXEMPT_METHODS = ('GET', 'HEAD')
+
+    def __init__(self, transport:httpx.AsyncHTTPTransport, max_per_host:int):
+        self.transport = transport
+        self.max_per_host = max_per_host
+        self.slots:dict[str,asyncio.Semaphore] = {}
+        self.in_flight:Counter = Counter()
+        self.requests:Counter = Counter()
+
+    async def handle_async_request(self, request:httpx.Request)->httpx.Response:
+        host = request.url.netloc.decode()
+        self.requests[host] += 1
+        if request.method in self.EXEMPT_METHODS or request.extensions.get('host_slot') is False:
+            return await self.transport.handle_async_request(request)
+        slot = self.slots.setdefault(host, asyncio.Semaphore(self.max_per_host))
+        await slot.acquire()
+        self.in_flight[host] += 1
+        released = False
+
+        def release():
+            nonlocal released
+            if not released:
+                released = True
+                self.in_flight[host] -= 1
+                slot.release()
+
+        try:
+            response = await self.transport.handle_async_request(request)
+        except BaseException:
+            release()
+            raise
+        return httpx.Response(
+            status_code=response.status_code,
+            headers=response.headers,
+            stream=_ReleasingStream(response.stream, release),
+            extensions=response.extensions,
+        )
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+class HttpPoolManager:
+    """ Process wide HTTP connection pool shared by the hubs, agent connections and push senders
+
+    HTTP/2 multiplexing needs the h2 package and a TLS endpoint, plain http servers stay on HTTP/1.1 keep-alive.
+    """
+    _instance = None
+    _initialized = False
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(HttpPoolManager,cls).__new__(cls)
+            cls._instance._init()
+        return cls._instance
+
+    def _init(self):
+        if self._initialized:
+            return
+        self.settings = LLM_Client().settings.http_pool
+        self._client:httpx.AsyncClient|None = None
+        self._transport:HostLimitedTransport|None = None
+        self._initialized = True
+
+    @property
+    def client(self)->httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            http2 = bool(self.settings.http2)
+            if http2 and importlib.util.find_spec("h2") is None:
+                logger.warning("h2 is not installed, the HTTP pool falls back to HTTP/1.1")
+                http2 = False
+            transport = httpx.AsyncHTTPTransport(
+                http2=http2,
+                limits=httpx.Limits(
+                    max_connections=self.settings.max_connections,
+                    max_keepalive_connections=self.settings.max_keepalive_connections,
+                    keepalive_expiry=self.settings.keepalive_expiry,
+                ),
+            )
+            self._transport = HostLimitedTransport(transport, self.settings.max_connections_per_host)
+            self._client = httpx.AsyncClient(
+                transport=self._transport,
+                timeout=httpx.Timeout(self.settings.timeout, connect=self.settings.connect_timeout),
+            )
+        return self._client
+
+    async def warm_up(self, addresses:list[str], path:str="/.well-known/agent.json"):
+        """ Resolves DNS and opens a kept alive connection to each address before the first call """
+        async def open_connection(address:str):
+            try:
+                await self.client.head(f"{address.rstrip('/')}{path}")
+            except httpx.HTTPError as e:
+                logger.warning(f'Warm up of {address} failed: {e}')
+        await asyncio.gather(*[open_connection(address) for address in addresses])
+
+    def stats(self)->dict[str,Any]:
+        if self._transport is None:
+            return {}
+        pool = getattr(self._transport.transport, '_pool', None)
+        connections = list(getattr(pool, 'connections', []))
+        return {
+            'connections': len(connections),
+            'idle_connections': sum(1 for connection in connections if connection.is_idle()),
+            'max_connections': self.settings.max_connections,
+            'in_flight': dict(self._transport.in_flight),
+            'requests': dict(self._transport.requests),
+        }
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
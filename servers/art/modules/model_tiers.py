@@ -0,0 +1,196 @@
+import asyncio
+import math
+import time
+from collections import Counter, defaultdict, deque
+from collections.abc import AsyncIterator, Sequence
+from typing import Any
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import BaseMessage, HumanMessage, ToolMessage
+from langchain_core.messages.utils import count_tokens_approximately
+from langchain_core.outputs import ChatGenerationChunk, ChatResult
+from pydantic import ConfigDict, Field
+from .rate_limiter import LLM_PRIORITY
+
+class TierPolicy:
+    """ Picks the tier of one model call from the messages it gets
+
+    Background calls (history summaries), the step after a discovery tool and short user turns go to the fast
+    tier, they only pick a tool or give a short answer. Everything else, like writing an answer from tool
+    results, goes to the large tier. short_query_tokens 0 keeps every user turn on the large tier.
+    """
+
+    def __init__(self, fast_tools:Sequence[str]=(), short_query_tokens:int=40, fast_tier:str='fast', large_tier:str='large'):
+        self.fast_tools = set(fast_tools)
+        self.short_query_tokens = short_query_tokens
+        self.fast_tier = fast_tier
+        self.large_tier = large_tier
+
+    def choose(self, messages:list[BaseMessage])->str:
+        if LLM_PRIORITY.get() == 'background':
+            return self.fast_tier
+        last = messages[-1] if messages else None
+        if isinstance(last, ToolMessage):
+            return self.fast_tier if last.name in self.fast_tools else self.large_tier
+        if isinstance(last, HumanMessage) and count_tokens_approximately([last]) <= self.short_query_tokens:
+            return self.fast_tier
+        return self.large_tier
+
+class TierStats:
+    """ Calls, failures and latency percentiles of every tier """
+
+    def __init__(self, samples:int=1000):
+        self.calls:Counter = Counter()
+        self.errors:Counter = Counter()
+        self.timeouts:Counter = Counter()
+        self.fallbacks:Counter = Counter()
+        self.latencies:defaultdict[str,deque[float]] = defaultdict(lambda: deque(maxlen=samples))
+
+    def record(self, tier:str, elapsed:float):
+        self.calls[tier] += 1
+        self.latencies[tier].append(elapsed)
+
+    @staticmethod
+    def percentile(values:list[float], percent:float)->float|None:
+        return round(values[min(len(values) - 1, math.ceil(len(values) * percent / 100) - 1)], 4) if values else None
+
+    def stats(self)->dict[str,Any]:
+        tiers = {}
+        for tier in set(self.calls) | set(self.errors) | set(self.timeouts) | set(self.fallbacks):
+            latencies = sorted(self.latencies[tier])
+            tiers[tier] = {
+                'calls': self.calls[tier],
+                'errors': self.errors[tier],
+                'timeouts': self.timeouts[tier],
+                'fallbacks': self.fallbacks[tier],
+                'p50': self.percentile(latencies, 50),
+                'p95': self.percentile(latencies, 95),
+            }
+        return tiers
+
+class TieredChatModel(BaseChatModel):
+    """ Chat model that sends every call to the tier picked by the policy
+
+    A call that finds its tier overloaded is retried once on the other tier. Only streamed calls time out, the timeout
+    bounds the time to the first chunk and closing the stream stops the first request. A blocking call runs in an
+    executor thread nothing can stop, timing it out would run both tiers at once. Tools are bound for every tier
+    on its own since the providers format them differently.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    tiers:dict[str,BaseChatModel]
+    policy:TierPolicy = Field(default_factory=TierPolicy)
+    timeouts:dict[str,float] = Field(default_factory=dict)
+    fallback:bool = True
+    tier_stats:TierStats = Field(default_factory=TierStats, exclude=True)
+
+    @property
+    def _llm_type(self)->str:
+        return 'tiered-chat-model'
+
+    def bind_tools(self, tools:Sequence[Any], **kwargs:Any):
+        return self.bind(tier_kwargs={name: model.bind_tools(tools, **kwargs).kwargs for name, model in self.tiers.items()})
+
+    def attempts(self, messages:list[BaseMessage])->list[str]:
+        first = self.policy.choose(messages)
+        others = [name for name in self.tiers if name != first] if self.fallback else []
+        return [first] + others[:1]
+
+    @staticmethod
+    def overloaded(error:Exception)->bool:
+        """ Throttling and unavailable responses, the OCI SDK errors carry the HTTP status """
+        status = getattr(error, 'status', None) or getattr(error, 'status_code', None)
+        return status in (429, 503) or 'too many requests' in str(error).lower()
+
+    def _failed(self, tier:str, error:Exception, last:bool)->bool:
+        """ Records the failure, True when the call should move to the next tier """
+        if isinstance(error, TimeoutError):
+            self.tier_stats.timeouts[tier] += 1
+        else:
+            self.tier_stats.errors[tier] += 1
+        retry = not last and (isinstance(error, TimeoutError) or self.overloaded(error))
+        if retry:
+            self.tier_stats.fallbacks[tier] += 1
+        return retry
+
+    def _generate(
+        self,
+        messages:list[BaseMessage],
+        stop:list[str]|None=None,
+        run_manager:CallbackManagerForLLMRun|None=None,
+        tier_kwargs:dict[str,dict[str,Any]]|None=None,
+        **kwargs:Any,
+    )->ChatResult:
+        attempts = self.attempts(messages)
+        for number, tier in enumerate(attempts):
+            started = time.perf_counter()
+            try:
+                result = self.tiers[tier]._generate(messages, stop, None, **kwargs, **(tier_kwargs or {}).get(tier, {}))
+            except Exception as e:
+                if self._failed(tier, e, number == len(attempts) - 1):
+                    continue
+                raise
+            self.tier_stats.record(tier, time.perf_counter() - started)
+            return result
+
+    async def _agenerate(
+        self,
+        messages:list[BaseMessage],
+        stop:list[str]|None=None,
+        run_manager:AsyncCallbackManagerForLLMRun|None=None,
+        tier_kwargs:dict[str,dict[str,Any]]|None=None,
+        **kwargs:Any,
+    )->ChatResult:
+        attempts = self.attempts(messages)
+        for number, tier in enumerate(attempts):
+            if number and self.rate_limiter:
+                await self.rate_limiter.aacquire(blocking=True)
+            started = time.perf_counter()
+            try:
+                result = await self.tiers[tier]._agenerate(messages, stop, None, **kwargs, **(tier_kwargs or {}).get(tier, {}))
+            except Exception as e:
+                if self._failed(tier, e, number == len(attempts) - 1):
+                    continue
+                raise
+            self.tier_stats.record(tier, time.perf_counter() - started)
+            return result
+
+    async def _astream(
+        self,
+        messages:list[BaseMessage],
+        stop:list[str]|None=None,
+        run_manager:AsyncCallbackManagerForLLMRun|None=None,
+        tier_kwargs:dict[str,dict[str,Any]]|None=None,
+        **kwargs:Any,
+    )->AsyncIterator[ChatGenerationChunk]:
+        attempts = self.attempts(messages)
+        for number, tier in enumerate(attempts):
+            if number and self.rate_limiter:
+                await self.rate_limiter.aacquire(blocking=True)
+            started = time.perf_counter()
+            stream = self.tiers[tier]._astream(messages, stop, None, **kwargs, **(tier_kwargs or {}).get(tier, {}))
+            try:
+                try:
+                    async with asyncio.timeout(self.timeouts.get(tier)):
+                        first = await anext(stream, None)
+                except Exception as e:
+                    if self._failed(tier, e, number == len(attempts) - 1):
+                        continue
+                    raise
+                if first is not None:
+                    yield first
+                    try:
+                        async for chunk in stream:
+                            yield chunk
+                    except Exception:
+                        # Chunks were already sent, the answer cannot move to the other tier
+                        self.tier_stats.errors[tier] += 1
+                        raise
+                self.tier_stats.record(tier, time.perf_counter() - started)
+                return
+            finally:
+                await stream.aclose()
+
+    def stats(self)->dict[str,Any]:
+        return self.tier_stats.stats()
@@ -0,0 +1,191 @@
+import asyncio
+import contextvars
+import threading
+import time
+from collections import Counter, deque
+from typing import Any
+from uuid import UUID
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import BaseMessage
+from langchain_core.messages.utils import count_tokens_approximately
+from langchain_core.outputs import LLMResult
+from langchain_core.rate_limiters import BaseRateLimiter
+
+# Lane of the LLM calls made from the current context, background work sets it for its own task
+LLM_PRIORITY:contextvars.ContextVar[str] = contextvars.ContextVar('llm_priority', default='interactive')
+
+class TokenBucket:
+    """ Refills rate units per second up to capacity, the level goes below zero when usage is corrected afterwards """
+
+    def __init__(self, rate:float, capacity:float):
+        self.rate = rate
+        self.capacity = capacity
+        self.level = capacity
+        self.updated = time.monotonic()
+
+    def refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount:float)->float:
+        """ Seconds until amount is available, the bucket must be refilled first """
+        return max(0.0, (min(amount, self.capacity) - self.level) / self.rate)
+
+class LLMRateLimiter(BaseRateLimiter):
+    """ Requests per second and tokens per minute limits shared by every model of the process
+
+    Waiting calls are served one at a time, first by lane priority then in arrival order, so a burst of
+    background work never passes an interactive turn and nobody fails. A background call waiting longer than
+    starvation_timeout is served as an interactive one. The token cost of a call is unknown before it runs,
+    the average of the past calls is taken and corrected with the real usage once the call ends.
+    """
+
+    LANES = ('interactive', 'background')
+
+    def __init__(
+        self,
+        requests_per_second:float=2.0,
+        burst:int=4,
+        tokens_per_minute:int=60000,
+        request_tokens:int=1500,
+        check_every:float=0.05,
+        starvation_timeout:float=30.0,
+    ):
+        self.requests = TokenBucket(requests_per_second, burst)
+        self.tokens = TokenBucket(tokens_per_minute / 60, tokens_per_minute) if tokens_per_minute else None
+        self.estimate = float(request_tokens)
+        self.check_every = check_every
+        self.starvation_timeout = starvation_timeout
+        self.lock = threading.Lock()
+        self.queues:dict[str,deque[tuple[float,object]]] = {lane: deque() for lane in self.LANES}
+        self.granted:Counter = Counter()
+        self.waited:Counter = Counter()
+        self.max_wait:Counter = Counter()
+        self.usage = UsageHandler(self)
+
+    def lane(self)->str:
+        lane = LLM_PRIORITY.get()
+        return lane if lane in self.queues else self.LANES[-1]
+
+    def _head(self)->object|None:
+        now = time.monotonic()
+        for lane in self.LANES[1:]:
+            queue = self.queues[lane]
+            if queue and now - queue[0][0] >= self.starvation_timeout:
+                return queue[0][1]
+        for lane in self.LANES:
+            if self.queues[lane]:
+                return self.queues[lane][0][1]
+        return None
+
+    def _try_take(self, ticket:object)->float:
+        """ Takes a request and the estimated tokens for ticket when it is its turn, returns 0 or the wait time """
+        self.requests.refill()
+        if self.tokens:
+            self.tokens.refill()
+        if self._head() is not ticket:
+            return self.check_every
+        wait = self.requests.wait_time(1)
+        if self.tokens:
+            wait = max(wait, self.tokens.wait_time(self.estimate))
+        if wait > 0:
+            return wait
+        self.requests.level -= 1
+        if self.tokens:
+            self.tokens.level -= self.estimate
+        return 0.0
+
+    def _enqueue(self, lane:str)->tuple[float,object]:
+        entry = (time.monotonic(), object())
+        with self.lock:
+            self.queues[lane].append(entry)
+        return entry
+
+    def _take(self, lane:str, entry:tuple[float,object])->float:
+        """ 0 once the call got its turn and left the queue, else the time to sleep before the next try """
+        with self.lock:
+            wait = self._try_take(entry[1])
+            if not wait:
+                self.queues[lane].remove(entry)
+                waited = time.monotonic() - entry[0]
+                self.granted[lane] += 1
+                self.waited[lane] += waited
+                self.max_wait[lane] = max(self.max_wait[lane], waited)
+            return wait
+
+    def _abandon(self, lane:str, entry:tuple[float,object]):
+        with self.lock:
+            if entry in self.queues[lane]:
+                self.queues[lane].remove(entry)
+
+    def acquire(self, *, blocking:bool=True)->bool:
+        lane = self.lane()
+        entry = self._enqueue(lane)
+        try:
+            while wait := self._take(lane, entry):
+                if not blocking:
+                    return False
+                time.sleep(min(wait, self.check_every))
+            return True
+        finally:
+            self._abandon(lane, entry)
+
+    async def aacquire(self, *, blocking:bool=True)->bool:
+        lane = self.lane()
+        entry = self._enqueue(lane)
+        try:
+            while wait := self._take(lane, entry):
+                if not blocking:
+                    return False
+                await asyncio.sleep(min(wait, self.check_every))
+            return True
+        finally:
+            # A cancelled caller leaves the queue
+            self._abandon(lane, entry)
+
+    def record(self, tokens:int):
+        """ Corrects the token bucket with the real usage of a finished call """
+        with self.lock:
+            if self.tokens:
+                self.tokens.level -= tokens - self.estimate
+            self.estimate = 0.9 * self.estimate + 0.1 * tokens
+
+    def stats(self)->dict[str,Any]:
+        with self.lock:
+            return {
+                'waiting': {lane: len(queue) for lane, queue in self.queues.items()},
+                'granted': dict(self.granted),
+                'average_wait': {lane: self.waited[lane] / count for lane, count in self.granted.items() if count},
+                'max_wait': dict(self.max_wait),
+                'request_tokens': round(self.estimate),
+                'tokens_available': round(self.tokens.level) if self.tokens else None,
+            }
+
+class UsageHandler(BaseCallbackHandler):
+    """ Reports the tokens of every finished model call to the rate limiter
+
+    The usage metadata is used when the provider returns it, otherwise the prompt and the answer are counted.
+    """
+
+    run_inline = True
+
+    def __init__(self, limiter:LLMRateLimiter):
+        self.limiter = limiter
+        self.prompts:dict[UUID,int] = {}
+
+    def on_chat_model_start(self, serialized:dict[str,Any], messages:list[list[BaseMessage]], *, run_id:UUID, **kwargs:Any):
+        self.prompts[run_id] = sum(count_tokens_approximately(batch) for batch in messages)
+
+    def on_llm_end(self, response:LLMResult, *, run_id:UUID, **kwargs:Any):
+        prompt = self.prompts.pop(run_id, 0)
+        for batch in response.generations:
+            for generation in batch:
+                usage = getattr(getattr(generation, 'message', None), 'usage_metadata', None)
+                if usage:
+                    self.limiter.record(usage['total_tokens'])
+                else:
+                    self.limiter.record(prompt + count_tokens_approximately([generation.text]))
+
+    def on_llm_error(self, error:BaseException, *, run_id:UUID, **kwargs:Any):
+        self.prompts.pop(run_id, None)
@@ -0,0 +1,63 @@
+""" Run from servers/art: python -m unittest discover tests """
+import asyncio
+import threading
+import time
+import unittest
+import uuid
+from unittest.mock import patch
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from pydantic import Field
+from a2a.server.request_handlers import DefaultRequestHandler
+from a2a.server.tasks import InMemoryTaskStore
+from a2a.types import Message, MessageSendParams, Part, Role, Task, TaskState, TextPart
+from modules.oci_client import LLM_Client, PooledChatOCIGenAI
+
+REQUESTS = 4
+DELAY = 0.5
+
+class BlockingStubModel(PooledChatOCIGenAI):
+    """ Answers after sleeping in the calling thread like the OCI client, it never reaches the service """
+
+    threads:list[str] = Field(default_factory=list)
+
+    def bind_tools(self, tools, **kwargs):
+        return self.bind()
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        time.sleep(DELAY)
+        self.threads.append(threading.current_thread().name)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="A bird, a wing, a song", id=str(uuid.uuid4())))])
+
+def message_params()->MessageSendParams:
+    return MessageSendParams(message=Message(
+        role=Role.user,
+        parts=[Part(root=TextPart(text="Write a poem about birds"))],
+        messageId=uuid.uuid4().hex,
+    ))
+
+class ConcurrentMessageSendTest(unittest.IsolatedAsyncioTestCase):
+
+    async def test_message_send_calls_overlap(self):
+        from art_server import build_lifespan
+        from agent_executor import ArtAgentExecutor
+        # Built without validation, the stub needs no OCI credentials
+        model = BlockingStubModel.model_construct()
+        with patch.object(LLM_Client, 'build_llm_client', return_value=model):
+            handler = DefaultRequestHandler(agent_executor=ArtAgentExecutor(), task_store=InMemoryTaskStore())
+
+        async with build_lifespan(REQUESTS)(None):
+            started = time.perf_counter()
+            results = await asyncio.gather(*[handler.on_message_send(message_params()) for _ in range(REQUESTS)])
+            elapsed = time.perf_counter() - started
+
+        for result in results:
+            self.assertIsInstance(result, Task)
+            self.assertEqual(result.status.state, TaskState.completed)
+        # Serialized calls would take REQUESTS x DELAY
+        self.assertLess(elapsed, 2 * DELAY)
+        self.assertEqual(len(model.threads), REQUESTS)
+        self.assertTrue(all(name.startswith('art-llm') for name in model.threads), model.threads)
+
+if __name__ == '__main__':
+    unittest.main()
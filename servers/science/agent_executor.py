@@ -3,30 +3,41 @@ from a2a.server.events import EventQueue
 from a2a.server.tasks import TaskUpdater
 from a2a.utils import new_agent_text_message
 from agent import ScienceAgent
+from modules.status_policy import StatusUpdatePolicy
+from modules.server_metrics import ServerMetrics
 from a2a.types import (
     InternalError,
     InvalidParamsError,
     Part,
     Task,
+    TaskNotCancelableError,
     TaskState,
     TextPart,
-    UnsupportedOperationError,
 )
 from a2a.utils.errors import ServerError
 from a2a.utils import (
     new_agent_text_message,
     new_task,
 )
-import logging
+import asyncio, logging, time, uuid
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+TERMINAL_STATES = {TaskState.completed, TaskState.canceled, TaskState.failed, TaskState.rejected}
+ACTIVE_STATES = {TaskState.submitted, TaskState.working}
+
 class ScienceAgentExecutor(AgentExecutor):
     """ Test song agent streaming """
 
-    def __init__(self):
+    def __init__(self, token_streaming: bool = False, status_policy: StatusUpdatePolicy | None = None):
         self.agent = ScienceAgent()
+        self.token_streaming = token_streaming
+        self.status_policy = status_policy or StatusUpdatePolicy()
+        self.metrics = ServerMetrics()
+        # Tasks executing in this process and the ones a tasks/cancel asked to stop
+        self.running:set[str] = set()
+        self.cancel_requests:set[str] = set()
 
     async def execute(
         self,
@@ -44,20 +55,42 @@ class ScienceAgentExecutor(AgentExecutor):
             await event_queue.enqueue_event(task)
 
         updater = TaskUpdater(event_queue, task.id, task.contextId)
+        wants_updates = self._wants_status_updates(context)
+        status = self.status_policy.for_task(updater, wants_updates)
+        artifact_id = None
+        message_id = None
+        started = time.perf_counter()
+        tokens = 0
+        self.running.add(task.id)
+        self.metrics.task_started()
+        # Blocking callers only read the final task, they get the answer in a single part
+        token_streaming = self.token_streaming and wants_updates
+        # Cancelling while the stream runs stops the graph and the model request under it
+        stream = self.agent.stream(query, task.contextId, token_streaming)
         try:
-            async for item in self.agent.stream(query, task.contextId):
+            async for item in stream:
                 is_task_complete = item['is_task_complete']
                 require_user_input = item['require_user_input']
-                if not is_task_complete and not require_user_input:
-                        await updater.update_status(
-                            TaskState.working,
-                            new_agent_text_message(
-                                item['content'],
-                                task.contextId,
-                                task.id,
-                            ),
-                        )
+                if item.get('is_token'):
+                    tokens += 1
+                    # Each model message streams into its own artifact, chunks are appended
+                    append = item['message_id'] == message_id
+                    if not append:
+                        if artifact_id is None:
+                            logger.info(f'First token for task {task.id} after {time.perf_counter() - started:.3f}s')
+                        artifact_id = str(uuid.uuid4())
+                        message_id = item['message_id']
+                    await updater.add_artifact(
+                        [Part(root=TextPart(text=item['content']))],
+                        artifact_id=artifact_id,
+                        name='conversion_result',
+                        append=append,
+                        last_chunk=False,
+                    )
+                elif not is_task_complete and not require_user_input:
+                        await status.push(item['content'])
                 elif require_user_input:
+                    await status.flush()
                     await updater.update_status(
                         TaskState.input_required,
                         new_agent_text_message(
@@ -68,7 +101,20 @@ class ScienceAgentExecutor(AgentExecutor):
                         final=True,
                     )
                     break
+                elif artifact_id:
+                    await status.flush()
+                    # The answer was already streamed, only close the artifact
+                    await updater.add_artifact(
+                        [Part(root=TextPart(text=''))],
+                        artifact_id=artifact_id,
+                        name='conversion_result',
+                        append=True,
+                        last_chunk=True,
+                    )
+                    await updater.complete()
+                    break
                 else:
+                    await status.flush()
                     await updater.add_artifact(
                         [Part(root=TextPart(text=item['content']))],
                         name='conversion_result',
@@ -76,10 +122,33 @@ class ScienceAgentExecutor(AgentExecutor):
                     await updater.complete()
                     break
 
+        except asyncio.CancelledError:
+            elapsed = time.perf_counter() - started
+            requested = task.id in self.cancel_requests
+            self.metrics.task_cancelled('cancel_request' if requested else 'disconnect', elapsed, tokens)
+            logger.info(f'Task {task.id} cancelled after {elapsed:.3f}s and {tokens} tokens')
+            if requested:
+                # The tasks/cancel caller waits for the final canceled status
+                await updater.cancel()
+            # The producer ends quietly, the request handler already knows why it was cancelled
+            return
         except Exception as e:
+            self.metrics.task_failed()
             logger.error(f'An error occurred while streaming the response: {e}')
             raise ServerError(error=InternalError()) from e
+        finally:
+            await stream.aclose()
+            self.running.discard(task.id)
+            self.cancel_requests.discard(task.id)
+        self.metrics.task_completed(time.perf_counter() - started, tokens)
+        logger.info(f'Task {task.id} sent {status.sent} of {status.received} working statuses')
 
+    def _wants_status_updates(self, context: RequestContext) -> bool:
+        """ Blocking callers and messages with metadata status_updates=false skip intermediate statuses and tokens """
+        if context.configuration and context.configuration.blocking:
+            return False
+        metadata = context.message.metadata if context.message else None
+        return not metadata or metadata.get('status_updates', True) is not False
 
     def _validate_request(self, context: RequestContext) -> bool:
         return False
@@ -87,4 +156,20 @@ class ScienceAgentExecutor(AgentExecutor):
     async def cancel(
         self, context: RequestContext, event_queue: EventQueue
     ) -> None:
-        raise ServerError(error=UnsupportedOperationError())
\ No newline at end of file
+        """ Stops a task running in this process, a task waiting for input is only marked as canceled
+
+        With several workers the task state is shared but its execution is not, like a live resubscribe
+        a running task can only be cancelled by the worker that runs it, the others refuse the request.
+        """
+        task = context.current_task
+        if not task or task.status.state in TERMINAL_STATES:
+            raise ServerError(error=TaskNotCancelableError())
+        if task.id in self.running:
+            # The request handler cancels the running execute, which sends the canceled status
+            self.cancel_requests.add(task.id)
+            return
+        if task.status.state in ACTIVE_STATES:
+            # Another worker process runs it, marking it canceled here would not stop the agent
+            raise ServerError(error=TaskNotCancelableError(message=f'Task {task.id} runs in another worker process'))
+        # Nothing runs the task, it waits for the user
+        await TaskUpdater(event_queue, task.id, task.contextId).cancel()
\ No newline at end of file
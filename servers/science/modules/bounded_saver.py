@@ -0,0 +1,146 @@
+import threading
+import time
+from collections import Counter, OrderedDict, defaultdict
+from collections.abc import Sequence
+from typing import Any
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import ChannelVersions, Checkpoint, CheckpointMetadata, CheckpointTuple
+from langgraph.checkpoint.memory import InMemorySaver
+
+class BoundedMemorySaver(InMemorySaver):
+    """ In memory checkpointer with a maximum thread count, idle TTL and checkpoint history depth per thread
+
+    Threads are evicted in LRU order, only the latest max_checkpoints of each thread are kept.
+    """
+
+    def __init__(self, max_threads:int=1000, idle_ttl:float=3600.0, max_checkpoints:int=10, **kwargs):
+        super().__init__(**kwargs)
+        self.max_threads = max_threads
+        self.idle_ttl = idle_ttl
+        self.max_checkpoints = max_checkpoints
+        self.lock = threading.RLock()
+        # thread id -> last access, oldest first
+        self.last_used:OrderedDict[str,float] = OrderedDict()
+        # Per thread indexes so eviction does not scan the whole storage
+        self.thread_writes:defaultdict[str,set[tuple[str,str,str]]] = defaultdict(set)
+        self.blob_refs:defaultdict[str,Counter] = defaultdict(Counter)
+        self.checkpoint_refs:dict[tuple[str,str,str],list[tuple[str,str,Any]]] = {}
+        self.evicted_threads = 0
+        self.trimmed_checkpoints = 0
+
+    def _touch(self, thread_id:str):
+        self.last_used[thread_id] = time.monotonic()
+        self.last_used.move_to_end(thread_id)
+
+    def _evict(self):
+        deadline = time.monotonic() - self.idle_ttl
+        while self.last_used:
+            thread_id, last_used = next(iter(self.last_used.items()))
+            if len(self.last_used) <= self.max_threads and last_used >= deadline:
+                break
+            self._drop_thread(thread_id)
+            self.evicted_threads += 1
+
+    def _drop_thread(self, thread_id:str):
+        self.last_used.pop(thread_id, None)
+        namespaces = self.storage.pop(thread_id, {})
+        for checkpoint_ns, checkpoints in namespaces.items():
+            for checkpoint_id in checkpoints:
+                self.checkpoint_refs.pop((thread_id, checkpoint_ns, checkpoint_id), None)
+                self.writes.pop((thread_id, checkpoint_ns, checkpoint_id), None)
+        for key in self.thread_writes.pop(thread_id, ()):
+            self.writes.pop(key, None)
+        for checkpoint_ns, channel, version in self.blob_refs.pop(thread_id, Counter()):
+            self.blobs.pop((thread_id, checkpoint_ns, channel, version), None)
+
+    def _trim_history(self, thread_id:str, checkpoint_ns:str):
+        checkpoints = self.storage[thread_id][checkpoint_ns]
+        if len(checkpoints) <= self.max_checkpoints:
+            return
+        refs = self.blob_refs[thread_id]
+        for checkpoint_id in sorted(checkpoints)[:len(checkpoints) - self.max_checkpoints]:
+            del checkpoints[checkpoint_id]
+            key = (thread_id, checkpoint_ns, checkpoint_id)
+            self.writes.pop(key, None)
+            self.thread_writes[thread_id].discard(key)
+            for ref in self.checkpoint_refs.pop(key, ()):
+                refs[ref] -= 1
+                if refs[ref] <= 0:
+                    del refs[ref]
+                    self.blobs.pop((thread_id, *ref), None)
+            self.trimmed_checkpoints += 1
+
+    def get_tuple(self, config:RunnableConfig)->CheckpointTuple|None:
+        thread_id = config["configurable"]["thread_id"]
+        with self.lock:
+            result = super().get_tuple(config)
+            if result is None:
+                # The parent lookup leaves an empty entry behind for unknown threads
+                if not any(self.storage.get(thread_id, {}).values()):
+                    self.storage.pop(thread_id, None)
+            else:
+                self._touch(thread_id)
+            return result
+
+    def put(
+        self,
+        config:RunnableConfig,
+        checkpoint:Checkpoint,
+        metadata:CheckpointMetadata,
+        new_versions:ChannelVersions,
+    )->RunnableConfig:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"]["checkpoint_ns"]
+        with self.lock:
+            saved = super().put(config, checkpoint, metadata, new_versions)
+            refs = [(checkpoint_ns, channel, version) for channel, version in checkpoint["channel_versions"].items()]
+            self.checkpoint_refs[(thread_id, checkpoint_ns, checkpoint["id"])] = refs
+            self.blob_refs[thread_id].update(refs)
+            self._touch(thread_id)
+            self._trim_history(thread_id, checkpoint_ns)
+            self._evict()
+            return saved
+
+    def put_writes(
+        self,
+        config:RunnableConfig,
+        writes:Sequence[tuple[str,Any]],
+        task_id:str,
+        task_path:str="",
+    )->None:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        with self.lock:
+            super().put_writes(config, writes, task_id, task_path)
+            self.thread_writes[thread_id].add((thread_id, checkpoint_ns, checkpoint_id))
+            self._touch(thread_id)
+
+    def delete_thread(self, thread_id:str)->None:
+        with self.lock:
+            self._drop_thread(thread_id)
+
+    def stats(self)->dict[str,Any]:
+        """ Memory usage counters, bytes are the serialized checkpoint, write and blob payloads """
+        with self.lock:
+            checkpoint_count = 0
+            stored_bytes = 0
+            for namespaces in self.storage.values():
+                for checkpoints in namespaces.values():
+                    checkpoint_count += len(checkpoints)
+                    for checkpoint, metadata, _ in checkpoints.values():
+                        stored_bytes += len(checkpoint[1]) + len(metadata[1])
+            write_count = 0
+            for writes in self.writes.values():
+                write_count += len(writes)
+                stored_bytes += sum(len(value[1]) for _, _, value, _ in writes.values())
+            stored_bytes += sum(len(value[1]) for value in self.blobs.values())
+            return {
+                'threads': len(self.last_used),
+                'checkpoints': checkpoint_count,
+                'writes': write_count,
+                'blobs': len(self.blobs),
+                'bytes': stored_bytes,
+                'evicted_threads': self.evicted_threads,
+                'trimmed_checkpoints': self.trimmed_checkpoints,
+            }
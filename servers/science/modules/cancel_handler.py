@@ -0,0 +1,97 @@
+import asyncio
+import logging
+from datetime import datetime, timezone
+from a2a.server.apps.jsonrpc.jsonrpc_app import DefaultCallContextBuilder
+from a2a.server.context import ServerCallContext
+from a2a.server.request_handlers import DefaultRequestHandler
+from a2a.server.request_handlers.default_request_handler import TERMINAL_TASK_STATES
+from a2a.types import InternalError, Message, MessageSendParams, Task, TaskState, TaskStatus
+from a2a.utils.errors import ServerError
+from starlette.requests import Request
+from modules.admission import AdmissionController
+
+logger = logging.getLogger(__name__)
+
+class RequestContextBuilder(DefaultCallContextBuilder):
+    """ Keeps the Starlette request in the call context so the handler can watch for the client disconnect """
+
+    def build(self, request:Request)->ServerCallContext:
+        context = super().build(request)
+        context.state['request'] = request
+        return context
+
+class CancellingRequestHandler(DefaultRequestHandler):
+    """ Request handler that stops the agent when its caller goes away
+
+    The default handler waits for the producer task even after the client disconnected, here a streaming
+    consumer cancelled by the disconnect cancels the producer, and blocking message/send calls watch the
+    connection while they wait. The cleanup of a cancelled producer runs in its own task and stores the
+    canceled state, the agent executor reports the reclaimed work.
+
+    With an admission controller new messages wait for an execution slot, the slot is held until the producer ends.
+    """
+
+    def __init__(self, *args, admission:AdmissionController|None=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.admission = admission
+        self.cleanups:set[asyncio.Task] = set()
+
+    async def on_message_send(self, params:MessageSendParams, context:ServerCallContext|None=None)->Message|Task:
+        request = context.state.get('request') if context else None
+        if request is None:
+            return await super().on_message_send(params, context)
+        disconnected = asyncio.Event()
+        watcher = asyncio.create_task(self._watch_disconnect(request, asyncio.current_task(), disconnected))
+        try:
+            return await super().on_message_send(params, context)
+        except asyncio.CancelledError:
+            if not disconnected.is_set():
+                raise
+            # Nobody reads the answer, the error only ends the request cleanly
+            asyncio.current_task().uncancel()
+            raise ServerError(error=InternalError(message='Client disconnected')) from None
+        finally:
+            watcher.cancel()
+
+    async def _setup_message_execution(self, params:MessageSendParams, context:ServerCallContext|None=None):
+        if self.admission is None:
+            return await super()._setup_message_execution(params, context)
+        # Rejected requests fail here, before any task is created
+        admitted = await self.admission.acquire()
+        try:
+            result = await super()._setup_message_execution(params, context)
+        except BaseException:
+            self.admission.release(admitted)
+            raise
+        producer_task = result[-1]
+        producer_task.add_done_callback(lambda _: self.admission.release(admitted))
+        return result
+
+    async def _watch_disconnect(self, request:Request, consumer:asyncio.Task, disconnected:asyncio.Event):
+        """ The body was already read, the next ASGI message only comes with the disconnect """
+        while (await request.receive())['type'] != 'http.disconnect':
+            pass
+        disconnected.set()
+        consumer.cancel()
+
+    async def _cleanup_producer(self, producer_task:asyncio.Task, task_id:str)->None:
+        current = asyncio.current_task()
+        if producer_task.done() or current is None or not current.cancelling():
+            return await super()._cleanup_producer(producer_task, task_id)
+        logger.info(f'Client of task {task_id} went away, cancelling the agent')
+        producer_task.cancel()
+        # The consumer is being cancelled, awaiting the producer here would be cut short
+        cleanup = asyncio.create_task(self._cleanup_cancelled(producer_task, task_id))
+        self.cleanups.add(cleanup)
+        cleanup.add_done_callback(self.cleanups.discard)
+
+    async def _cleanup_cancelled(self, producer_task:asyncio.Task, task_id:str):
+        """ Waits for the agent to stop, then stores the canceled state nobody consumed """
+        await asyncio.wait({producer_task})
+        await self._queue_manager.close(task_id)
+        async with self._running_agents_lock:
+            self._running_agents.pop(task_id, None)
+        task = await self.task_store.get(task_id)
+        if task and task.status.state not in TERMINAL_TASK_STATES:
+            task.status = TaskStatus(state=TaskState.canceled, timestamp=datetime.now(timezone.utc).isoformat())
+            await self.task_store.save(task)
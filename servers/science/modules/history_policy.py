@@ -0,0 +1,114 @@
+import asyncio
+import contextvars
+import logging
+from collections import OrderedDict
+from typing import Any
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AnyMessage, HumanMessage, SystemMessage, get_buffer_string
+from langchain_core.messages.utils import count_tokens_approximately
+from langchain_core.runnables import RunnableConfig
+from modules.rate_limiter import LLM_PRIORITY
+
+logger = logging.getLogger(__name__)
+
+class HistoryPolicy:
+    """ Pre model hook that caps the history sent to the LLM
+
+    Keeps the last max_turns user turns inside a token budget, the turns left out are
+    summarized in the background and the summary is sent in their place.
+    """
+
+    SUMMARY_INSTRUCTION = (
+        "Summarize the conversation below in less than 120 words, keep names, facts and open requests. "
+        "Extend the previous summary when there is one."
+    )
+
+    def __init__(
+        self,
+        max_turns:int=6,
+        max_tokens:int=3000,
+        summarize:bool=True,
+        max_summaries:int=1000,
+        summary_model:BaseChatModel|None=None,
+    ):
+        self.max_turns = max_turns
+        self.max_tokens = max_tokens
+        self.summarize = summarize and summary_model is not None
+        self.max_summaries = max_summaries
+        self.summary_model = summary_model
+        # thread id -> (messages covered, summary), least recently used first
+        self.summaries:OrderedDict[str,tuple[int,str]] = OrderedDict()
+        self.running:dict[str,asyncio.Task] = {}
+        self.calls = 0
+        self.history_tokens = 0
+        self.prompt_tokens = 0
+
+    @staticmethod
+    def split_turns(messages:list[AnyMessage])->list[list[AnyMessage]]:
+        """ A turn starts at each user message, so tool calls stay next to their results """
+        turns:list[list[AnyMessage]] = []
+        for message in messages:
+            if isinstance(message, HumanMessage) or not turns:
+                turns.append([])
+            turns[-1].append(message)
+        return turns
+
+    def window(self, messages:list[AnyMessage])->tuple[int,list[AnyMessage]]:
+        """ Returns how many leading messages are dropped and the messages kept """
+        turns = self.split_turns(messages)[-self.max_turns:]
+        tokens = [count_tokens_approximately(turn) for turn in turns]
+        # The current turn is always kept, even above the budget
+        while len(turns) > 1 and sum(tokens) > self.max_tokens:
+            turns.pop(0)
+            tokens.pop(0)
+        kept = [message for turn in turns for message in turn]
+        return len(messages) - len(kept), kept
+
+    async def trim(self, state:dict[str,Any], config:RunnableConfig)->dict[str,Any]:
+        messages = state['messages']
+        dropped, kept = self.window(messages)
+        thread_id = config.get('configurable', {}).get('thread_id')
+        if dropped and thread_id is not None:
+            covered, summary = self.summaries.get(thread_id, (0, ''))
+            if summary:
+                self.summaries.move_to_end(thread_id)
+                kept = [SystemMessage(content=f"Summary of the earlier conversation: {summary}")] + kept
+            if self.summarize and covered < dropped and thread_id not in self.running:
+                # A fresh context keeps the summary call out of the graph callbacks and streams
+                task = asyncio.create_task(
+                    self._summarize(thread_id, messages[covered:dropped], dropped, summary),
+                    context=contextvars.Context(),
+                )
+                self.running[thread_id] = task
+                task.add_done_callback(lambda _: self.running.pop(thread_id, None))
+        self.calls += 1
+        self.history_tokens += count_tokens_approximately(messages)
+        self.prompt_tokens += count_tokens_approximately(kept)
+        return {'llm_input_messages': kept}
+
+    async def _summarize(self, thread_id:str, messages:list[AnyMessage], covered:int, previous:str):
+        # Runs in its own context, the summary waits behind the interactive model calls
+        LLM_PRIORITY.set('background')
+        conversation = get_buffer_string(messages)
+        if previous:
+            conversation = f"Previous summary: {previous}\n{conversation}"
+        try:
+            response = await self.summary_model.ainvoke([
+                SystemMessage(content=self.SUMMARY_INSTRUCTION),
+                HumanMessage(content=conversation),
+            ])
+            self.summaries[thread_id] = (covered, str(response.content))
+            self.summaries.move_to_end(thread_id)
+            while len(self.summaries) > self.max_summaries:
+                self.summaries.popitem(last=False)
+        except Exception as e:
+            logger.error(f'History summary failed for thread {thread_id}: {e}')
+
+    def stats(self)->dict[str,Any]:
+        return {
+            'calls': self.calls,
+            'history_tokens': self.history_tokens,
+            'prompt_tokens': self.prompt_tokens,
+            'tokens_saved': self.history_tokens - self.prompt_tokens,
+            'summaries': len(self.summaries),
+        }
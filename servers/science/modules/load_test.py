@@ -0,0 +1,65 @@
+import asyncio
+import statistics
+import sys
+import time
+import uuid
+import httpx
+
+async def send(client:httpx.AsyncClient, url:str, method:str, params:dict)->dict:
+    response = await client.post(url, json={"jsonrpc": "2.0", "id": str(uuid.uuid4()), "method": method, "params": params})
+    response.raise_for_status()
+    return response.json()
+
+async def main(url:str="http://localhost:8888/", requests:int=200, concurrency:int=32, query:str="What is the meaning of LamBot?"):
+    """ Throughput of a running server, run it against --workers 1, 2, 4 to compare
+
+    Every task is then read back with tasks/get, with several workers the lookup lands on any process
+    so a missing task means the state is not shared.
+    """
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(timeout=300.0, limits=limits) as client:
+        semaphore = asyncio.Semaphore(concurrency)
+        latencies:list[float] = []
+        task_ids:list[str] = []
+        errors = 0
+
+        async def message():
+            nonlocal errors
+            async with semaphore:
+                started = time.perf_counter()
+                try:
+                    result = await send(client, url, "message/send", {
+                        "message": {
+                            "role": "user",
+                            "parts": [{"kind": "text", "text": query}],
+                            "messageId": uuid.uuid4().hex,
+                        },
+                        "configuration": {"blocking": True},
+                    })
+                except httpx.HTTPError:
+                    errors += 1
+                    return
+                latencies.append(time.perf_counter() - started)
+                if "error" in result:
+                    errors += 1
+                elif result["result"].get("kind") == "task":
+                    task_ids.append(result["result"]["id"])
+
+        started = time.perf_counter()
+        await asyncio.gather(*[message() for _ in range(requests)])
+        elapsed = time.perf_counter() - started
+        print(f"{requests} requests, {concurrency} concurrent: {requests / elapsed:.2f} req/s, {errors} errors")
+        if latencies:
+            latencies.sort()
+            print(f"latency p50 {statistics.median(latencies):.3f}s p99 {latencies[int(len(latencies) * 0.99) - 1]:.3f}s")
+
+        missing = 0
+        for task_id in task_ids:
+            result = await send(client, url, "tasks/get", {"id": task_id})
+            if "error" in result:
+                missing += 1
+        print(f"tasks/get: {len(task_ids) - missing} of {len(task_ids)} tasks found")
+
+if __name__ == "__main__":
+    url = sys.argv[1] if len(sys.argv) > 1 else "http://localhost:8888/"
+    asyncio.run(main(url, *(int(arg) for arg in sys.argv[2:4])))
@@ -1,8 +1,83 @@
 from dotenv import load_dotenv
 load_dotenv()
+import asyncio
+import logging
+import sys
+import threading
+import time
+from collections.abc import AsyncIterator
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
 from .config.config import Settings
+from .rate_limiter import LLMRateLimiter
+from .model_tiers import TieredChatModel, TierPolicy
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatGenerationChunk, ChatResult
+from langchain_core.runnables.config import run_in_executor
 from langchain_community.chat_models.oci_generative_ai import ChatOCIGenAI
 
+logger = logging.getLogger(__name__)
+
+class PooledChatOCIGenAI(ChatOCIGenAI):
+    """ OCI chat model whose blocking calls run on the LLM executor of the process
+
+    LangChain runs blocking models in the loop default executor, which every asyncio.to_thread call shares.
+    The server installs its own LLM executor, without one the default executor is used.
+    The response stream is closed as soon as the task reading it is cancelled, the default async stream
+    leaves it open and the service keeps generating. A blocking (non streamed) call cannot be cut,
+    it ends with the current model step.
+    """
+
+    async def _agenerate(
+        self,
+        messages:list[BaseMessage],
+        stop:list[str]|None=None,
+        run_manager:AsyncCallbackManagerForLLMRun|None=None,
+        **kwargs:Any,
+    )->ChatResult:
+        return await run_in_executor(
+            LLM_Client().executor, self._generate, messages, stop, run_manager.get_sync() if run_manager else None, **kwargs
+        )
+
+    async def _astream(
+        self,
+        messages:list[BaseMessage],
+        stop:list[str]|None=None,
+        run_manager:AsyncCallbackManagerForLLMRun|None=None,
+        **kwargs:Any,
+    )->AsyncIterator[ChatGenerationChunk]:
+        executor = LLM_Client().executor
+        loop = asyncio.get_running_loop()
+        iterator = await run_in_executor(
+            executor, self._stream, messages, stop, run_manager.get_sync() if run_manager else None, **kwargs
+        )
+        # next and close must not overlap, close waits for the chunk being read
+        lock = threading.Lock()
+        done = object()
+
+        def next_chunk():
+            with lock:
+                return next(iterator, done)
+
+        def close():
+            with lock:
+                try:
+                    iterator.close()
+                except Exception as e:
+                    logger.warning(f'OCI stream not closed: {e}')
+
+        try:
+            while True:
+                chunk = await run_in_executor(executor, next_chunk)
+                if chunk is done:
+                    break
+                yield chunk
+        finally:
+            # Not awaited, the reading task may be cancelled already
+            loop.run_in_executor(executor, close)
+
 class LLM_Client:
     _instance = None
     _initialized = False
@@ -16,18 +91,75 @@ class LLM_Client:
     def _init(self):
         if self._initialized:
             return
+        # Installed by the server lifespan, the blocking model calls run there
+        self.executor:ThreadPoolExecutor|None = None
         self.settings = Settings(r"C:\Users\Cristopher Hdz\Desktop\Test\a2a_basics\servers\science\modules\config\config.yaml")
+        limits = self.settings.rate_limiter
+        # One limiter for the process, every model built here shares it
+        self.rate_limiter = LLMRateLimiter(
+            requests_per_second=limits.requests_per_second,
+            burst=limits.burst,
+            tokens_per_minute=limits.tokens_per_minute,
+            request_tokens=limits.request_tokens,
+            starvation_timeout=limits.starvation_timeout,
+        ) if limits.enabled else None
+        # Models are shared by every agent of the process, the OCI SDK client and its session by every model
+        self.models:dict[tuple,ChatOCIGenAI] = {}
+        self.oci_clients:dict[tuple,Any] = {}
+        self.tiered:TieredChatModel|None = None
+        # Reentrant, the tiered model builds its tiers while holding it
+        self.lock = threading.RLock()
         self._initialized = True
 
-    def build_llm_client(self):
-        llm = ChatOCIGenAI(
-            model_id="cohere.command-a-03-2025",
-            service_endpoint=self.settings.oci_client.endpoint,
-            compartment_id=self.settings.oci_client.compartiment,
-            model_kwargs={"temperature":0.8, "max_tokens":self.settings.oci_client.max_tokens},
-            auth_profile=self.settings.oci_client.configProfile,
-            auth_file_location=self.settings.oci_client.config_path
+    def build_llm_client(self, model_id:str|None=None, **model_kwargs:Any)->ChatOCIGenAI:
+        """ Cached model for model_id and the generation parameters, built on first use """
+        model_id = model_id or self.settings.oci_client.model_id
+        model_kwargs = {"temperature":self.settings.oci_client.temperature, "max_tokens":self.settings.oci_client.max_tokens, **model_kwargs}
+        key = (model_id, tuple(sorted(model_kwargs.items())))
+        with self.lock:
+            llm = self.models.get(key)
+            if llm is None:
+                llm = self._create_llm(model_id, model_kwargs)
+                self.models[key] = llm
+        return llm
+
+    def build_tier(self, name:str)->ChatOCIGenAI:
+        tier = self.settings.model_tiers.tiers[name]
+        return self.build_llm_client(tier.model_id, temperature=tier.temperature, max_tokens=tier.max_tokens)
+
+    def build_tiered_client(self)->BaseChatModel:
+        """ Model that picks the fast or the large tier for every call, the configured model when tiers are off """
+        tiers = self.settings.model_tiers
+        if not tiers.enabled:
+            return self.build_llm_client()
+        with self.lock:
+            if self.tiered is None:
+                self.tiered = TieredChatModel(
+                    tiers={name: self.build_tier(name) for name in tiers.tiers},
+                    policy=TierPolicy(fast_tools=tiers.fast_tools, short_query_tokens=tiers.short_query_tokens),
+                    timeouts={name: tier.timeout for name, tier in tiers.tiers.items()},
+                    fallback=tiers.fallback,
+                    rate_limiter=self.rate_limiter,
+                    callbacks=[self.rate_limiter.usage] if self.rate_limiter else None,
+                )
+        return self.tiered
+
+    def _create_llm(self, model_id:str, model_kwargs:dict[str,Any])->ChatOCIGenAI:
+        oci_settings = self.settings.oci_client
+        client_key = (oci_settings.endpoint, oci_settings.configProfile, oci_settings.config_path)
+        llm = PooledChatOCIGenAI(
+            model_id=model_id,
+            service_endpoint=oci_settings.endpoint,
+            compartment_id=oci_settings.compartiment,
+            model_kwargs=model_kwargs,
+            auth_profile=oci_settings.configProfile,
+            auth_file_location=oci_settings.config_path,
+            rate_limiter=self.rate_limiter,
+            callbacks=[self.rate_limiter.usage] if self.rate_limiter else None,
+            # The auth parsing and the session are done once, later models reuse the SDK client
+            client=self.oci_clients.get(client_key),
         )
+        self.oci_clients[client_key] = llm.client
         return llm
 
 def main():
@@ -39,5 +171,29 @@ def main():
         print("MODEL:")
         print(response.content)
 
+def benchmark():
+    """ Startup cost of the models: first build with the OCI client, cached build, new parameters, first calls """
+    started = time.perf_counter()
+    llm = LLM_Client()
+    print(f"settings:             {(time.perf_counter() - started) * 1000:8.2f}ms")
+    started = time.perf_counter()
+    llm_client = llm.build_llm_client()
+    print(f"first build:          {(time.perf_counter() - started) * 1000:8.2f}ms")
+    started = time.perf_counter()
+    for _ in range(1000):
+        llm.build_llm_client()
+    # 1000 calls, the total in seconds is the average in milliseconds
+    print(f"cached build:         {(time.perf_counter() - started):8.4f}ms")
+    started = time.perf_counter()
+    llm.build_llm_client(temperature=0.2)
+    print(f"new parameters build: {(time.perf_counter() - started) * 1000:8.2f}ms")
+    for call in ("first call", "second call"):
+        started = time.perf_counter()
+        llm_client.invoke("Answer with one word: ready?")
+        print(f"{call + ':':22}{(time.perf_counter() - started) * 1000:8.2f}ms")
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    if "--benchmark" in sys.argv:
+        benchmark()
+    else:
+        main()
\ No newline at end of file
@@ -0,0 +1,83 @@
+import time
+from collections import Counter
+from collections.abc import Callable
+from typing import Any
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+
+class ServerMetrics:
+    """ Process wide counters of the agent server, served as JSON on /metrics
+
+    Cancelled tasks report what they already used and an estimate of what they would still have used,
+    the average duration and streamed tokens of the completed tasks minus what the cancelled task ran.
+    """
+    _instance = None
+    _initialized = False
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(ServerMetrics,cls).__new__(cls)
+            cls._instance._init()
+        return cls._instance
+
+    def _init(self):
+        if self._initialized:
+            return
+        self.started = time.time()
+        self.tasks_started = 0
+        self.tasks_completed = 0
+        self.completed_seconds = 0.0
+        self.completed_tokens = 0
+        self.tasks_failed = 0
+        self.cancelled:Counter = Counter()
+        self.cancelled_seconds = 0.0
+        self.cancelled_tokens = 0
+        self.reclaimed_seconds = 0.0
+        self.reclaimed_tokens = 0
+        # Other components add their stats under their own key
+        self.sources:dict[str,Callable[[],dict[str,Any]]] = {}
+        self._initialized = True
+
+    def register(self, name:str, stats:Callable[[],dict[str,Any]]):
+        self.sources[name] = stats
+
+    def task_started(self):
+        self.tasks_started += 1
+
+    def task_completed(self, elapsed:float, tokens:int):
+        self.tasks_completed += 1
+        self.completed_seconds += elapsed
+        self.completed_tokens += tokens
+
+    def task_failed(self):
+        self.tasks_failed += 1
+
+    def task_cancelled(self, reason:str, elapsed:float, tokens:int):
+        self.cancelled[reason] += 1
+        self.cancelled_seconds += elapsed
+        self.cancelled_tokens += tokens
+        if self.tasks_completed:
+            self.reclaimed_seconds += max(0.0, self.completed_seconds / self.tasks_completed - elapsed)
+            self.reclaimed_tokens += max(0, round(self.completed_tokens / self.tasks_completed) - tokens)
+
+    def stats(self)->dict[str,Any]:
+        return {
+            'uptime': time.time() - self.started,
+            'tasks': {
+                'started': self.tasks_started,
+                'completed': self.tasks_completed,
+                'failed': self.tasks_failed,
+                'running': self.tasks_started - self.tasks_completed - self.tasks_failed - sum(self.cancelled.values()),
+            },
+            'cancellation': {
+                'cancelled': dict(self.cancelled),
+                'used_seconds': round(self.cancelled_seconds, 3),
+                'used_tokens': self.cancelled_tokens,
+                'reclaimed_seconds_estimate': round(self.reclaimed_seconds, 3),
+                'reclaimed_tokens_estimate': self.reclaimed_tokens,
+            },
+            **{name: stats() for name, stats in self.sources.items()},
+        }
+
+    async def endpoint(self, request:Request)->JSONResponse:
+        return JSONResponse(self.stats())
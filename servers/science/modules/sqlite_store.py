@@ -0,0 +1,511 @@
+import asyncio
+import functools
+import itertools
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable, Sequence
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+from a2a.server.tasks import PushNotificationConfigStore, TaskStore
+from a2a.types import PushNotificationConfig, Task, TaskState
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import ChannelVersions, Checkpoint, CheckpointMetadata, CheckpointTuple
+from .bounded_saver import BoundedMemorySaver
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_STATES = [TaskState.completed.value, TaskState.canceled.value, TaskState.failed.value, TaskState.rejected.value]
+
+class SQLiteDatabase:
+    """ SQLite connection in WAL mode shared by the stores of a server, writes are batched by a background thread
+
+    The event loop only touches the pending batch, the reads and the checkpointer run on the executor of
+    the database, apart from the LLM executor and the loop default one.
+    In shared mode several server processes use the same file, the writes of a call are committed before
+    it returns so the other processes read them right away.
+    """
+
+    _databases:dict[str,"SQLiteDatabase"] = {}
+
+    def __init__(self, path:str, batch_size:int=256, flush_interval:float=0.05, workers:int=4, shared:bool=False):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.shared = shared
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA busy_timeout=5000")
+        # The connection lock is held during disk I/O, the pending lock only while the batch is changed
+        self.lock = threading.RLock()
+        self.pending_lock = threading.Lock()
+        # key -> (sql, params), writes to the same key are coalesced
+        self.pending:OrderedDict[Any,tuple[str,tuple]] = OrderedDict()
+        self.counter = itertools.count()
+        self.wake = threading.Event()
+        self.closed = False
+        self.flushed_rows = 0
+        self.flushes = 0
+        self.writer = threading.Thread(target=self._flush_loop, name="sqlite-writer", daemon=True)
+        self.writer.start()
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="sqlite")
+
+    @classmethod
+    def open(cls, settings)->"SQLiteDatabase":
+        """ One database per path in the process, built from the storage section of config.yaml """
+        if settings.path not in cls._databases:
+            cls._databases[settings.path] = cls(settings.path, settings.batch_size, settings.flush_interval)
+        return cls._databases[settings.path]
+
+    def executescript(self, script:str):
+        with self.lock:
+            self.conn.executescript(script)
+
+    async def run(self, func:Callable, *args:Any)->Any:
+        """ Runs a blocking call of the stores on the database executor """
+        return await asyncio.get_running_loop().run_in_executor(self.executor, functools.partial(func, *args))
+
+    def write(self, sql:str, params:tuple, key:Any=None):
+        with self.pending_lock:
+            if key is None:
+                key = next(self.counter)
+            self.pending[key] = (sql, params)
+            full = len(self.pending) >= self.batch_size
+        if full:
+            self.wake.set()
+
+    def commit(self):
+        """ Commits the pending batch right away in shared mode, otherwise the writer thread does it """
+        if self.shared:
+            self.flush()
+
+    async def awrite(self, sql:str, params:tuple, key:Any=None):
+        """ Writes from the event loop, in shared mode the commit runs on the database executor """
+        self.write(sql, params, key)
+        if self.shared:
+            await self.run(self.flush)
+
+    def pending_params(self, key:Any)->tuple|None:
+        with self.pending_lock:
+            entry = self.pending.get(key)
+            return entry[1] if entry else None
+
+    def flush(self):
+        with self.lock:
+            with self.pending_lock:
+                if not self.pending:
+                    return
+                batch = list(self.pending.values())
+                self.pending.clear()
+            self.conn.execute("BEGIN")
+            try:
+                for sql, params in batch:
+                    self.conn.execute(sql, params)
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.flushed_rows += len(batch)
+            self.flushes += 1
+
+    def _flush_loop(self):
+        while not self.closed:
+            self.wake.wait(self.flush_interval)
+            self.wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f'SQLite batch write failed: {e}')
+
+    def query(self, sql:str, params:tuple=())->list[tuple]:
+        with self.lock:
+            self.flush()
+            return self.conn.execute(sql, params).fetchall()
+
+    def execute(self, sql:str, params:tuple=())->int:
+        """ Runs a statement right away after the pending batch, returns the changed row count """
+        with self.lock:
+            self.flush()
+            return self.conn.execute(sql, params).rowcount
+
+    def close(self):
+        self.closed = True
+        self.wake.set()
+        self.writer.join()
+        self.executor.shutdown(wait=True)
+        self.flush()
+        self.conn.close()
+        SQLiteDatabase._databases.pop(self.path, None)
+
+class SQLiteTaskStore(TaskStore):
+    """ A2A task store persisted in SQLite, indexed by task and context ID """
+
+    def __init__(self, db:SQLiteDatabase):
+        self.db = db
+        self.db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS tasks (
+                id TEXT PRIMARY KEY,
+                context_id TEXT NOT NULL,
+                state TEXT NOT NULL,
+                updated REAL NOT NULL,
+                data TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS tasks_context_id ON tasks (context_id);
+            CREATE INDEX IF NOT EXISTS tasks_updated ON tasks (state, updated);
+            """
+        )
+
+    async def save(self, task:Task)->None:
+        await self.db.awrite(
+            "INSERT OR REPLACE INTO tasks (id, context_id, state, updated, data) VALUES (?, ?, ?, ?, ?)",
+            (task.id, task.context_id, task.status.state.value, time.time(), task.model_dump_json()),
+            key=('task', task.id),
+        )
+
+    async def get(self, task_id:str)->Task|None:
+        params = self.db.pending_params(('task', task_id))
+        if params is not None:
+            # Read your own write while it waits for the next batch
+            return Task.model_validate_json(params[4]) if len(params) == 5 else None
+        rows = await self.db.run(self.db.query, "SELECT data FROM tasks WHERE id = ?", (task_id,))
+        return Task.model_validate_json(rows[0][0]) if rows else None
+
+    async def delete(self, task_id:str)->None:
+        await self.db.awrite("DELETE FROM tasks WHERE id = ?", (task_id,), key=('task', task_id))
+
+    async def get_by_context(self, context_id:str)->list[Task]:
+        rows = await self.db.run(
+            self.db.query, "SELECT data FROM tasks WHERE context_id = ? ORDER BY updated", (context_id,)
+        )
+        return [Task.model_validate_json(row[0]) for row in rows]
+
+    def compact(self, retention:float)->int:
+        """ Deletes the tasks in a terminal state not updated during the retention seconds """
+        placeholders = ','.join('?' * len(TERMINAL_STATES))
+        return self.db.execute(
+            f"DELETE FROM tasks WHERE state IN ({placeholders}) AND updated < ?",
+            (*TERMINAL_STATES, time.time() - retention),
+        )
+
+class SQLitePushNotificationConfigStore(PushNotificationConfigStore):
+    """ Push notification configs persisted in SQLite, so every server process can notify any task """
+
+    def __init__(self, db:SQLiteDatabase):
+        self.db = db
+        self.db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS push_configs (
+                task_id TEXT NOT NULL,
+                config_id TEXT NOT NULL,
+                created REAL NOT NULL,
+                data TEXT NOT NULL,
+                PRIMARY KEY (task_id, config_id)
+            );
+            """
+        )
+
+    async def set_info(self, task_id:str, notification_config:PushNotificationConfig)->None:
+        if notification_config.id is None:
+            notification_config.id = task_id
+        await self.db.awrite(
+            "INSERT OR REPLACE INTO push_configs (task_id, config_id, created, data) VALUES (?, ?, ?, ?)",
+            (task_id, notification_config.id, time.time(), notification_config.model_dump_json()),
+            key=('push', task_id, notification_config.id),
+        )
+
+    async def get_info(self, task_id:str)->list[PushNotificationConfig]:
+        rows = await self.db.run(
+            self.db.query, "SELECT data FROM push_configs WHERE task_id = ? ORDER BY created", (task_id,)
+        )
+        return [PushNotificationConfig.model_validate_json(row[0]) for row in rows]
+
+    async def delete_info(self, task_id:str, config_id:str|None=None)->None:
+        config_id = config_id or task_id
+        await self.db.awrite(
+            "DELETE FROM push_configs WHERE task_id = ? AND config_id = ?",
+            (task_id, config_id),
+            key=('push', task_id, config_id),
+        )
+
+    def compact(self, retention:float)->int:
+        """ Deletes the configs older than the retention seconds whose task is already gone """
+        return self.db.execute(
+            "DELETE FROM push_configs WHERE created < ? AND NOT EXISTS (SELECT 1 FROM tasks WHERE tasks.id = push_configs.task_id)",
+            (time.time() - retention,),
+        )
+
+class SQLiteCheckpointSaver(BoundedMemorySaver):
+    """ Bounded in memory checkpointer written through to SQLite
+
+    Hot threads are served from memory, evicted threads are loaded back from the database on access.
+    The async methods run on the database executor since loading a thread waits for the disk.
+    In shared mode other processes write the same threads, so every lookup reloads the thread from the database.
+    """
+
+    def __init__(self, db:SQLiteDatabase, shared:bool=False, **kwargs):
+        super().__init__(**kwargs)
+        self.db = db
+        self.shared = shared
+        self.db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS checkpoints (
+                thread_id TEXT NOT NULL,
+                checkpoint_ns TEXT NOT NULL,
+                checkpoint_id TEXT NOT NULL,
+                checkpoint_type TEXT NOT NULL,
+                checkpoint BLOB NOT NULL,
+                metadata_type TEXT NOT NULL,
+                metadata BLOB NOT NULL,
+                parent_id TEXT,
+                created REAL NOT NULL,
+                PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+            );
+            CREATE INDEX IF NOT EXISTS checkpoints_created ON checkpoints (created);
+            CREATE TABLE IF NOT EXISTS checkpoint_blobs (
+                thread_id TEXT NOT NULL,
+                checkpoint_ns TEXT NOT NULL,
+                checkpoint_id TEXT NOT NULL,
+                channel TEXT NOT NULL,
+                version TEXT NOT NULL,
+                PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, channel)
+            );
+            CREATE TABLE IF NOT EXISTS blobs (
+                thread_id TEXT NOT NULL,
+                checkpoint_ns TEXT NOT NULL,
+                channel TEXT NOT NULL,
+                version TEXT NOT NULL,
+                type TEXT NOT NULL,
+                value BLOB NOT NULL,
+                PRIMARY KEY (thread_id, checkpoint_ns, channel, version)
+            );
+            CREATE TABLE IF NOT EXISTS writes (
+                thread_id TEXT NOT NULL,
+                checkpoint_ns TEXT NOT NULL,
+                checkpoint_id TEXT NOT NULL,
+                task_id TEXT NOT NULL,
+                idx INTEGER NOT NULL,
+                channel TEXT NOT NULL,
+                type TEXT NOT NULL,
+                value BLOB NOT NULL,
+                task_path TEXT NOT NULL,
+                PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+            );
+            """
+        )
+
+    def _load_thread(self, thread_id:str):
+        rows = self.db.query(
+            "SELECT checkpoint_ns, checkpoint_id, checkpoint_type, checkpoint, metadata_type, metadata, parent_id "
+            "FROM checkpoints WHERE thread_id = ? ORDER BY checkpoint_id DESC",
+            (thread_id,),
+        )
+        if not rows:
+            return
+        kept:set[tuple[str,str]] = set()
+        for checkpoint_ns, checkpoint_id, checkpoint_type, checkpoint, metadata_type, metadata, parent_id in rows:
+            checkpoints = self.storage[thread_id][checkpoint_ns]
+            if len(checkpoints) >= self.max_checkpoints:
+                continue
+            checkpoints[checkpoint_id] = ((checkpoint_type, checkpoint), (metadata_type, metadata), parent_id)
+            kept.add((checkpoint_ns, checkpoint_id))
+        refs = self.blob_refs[thread_id]
+        for checkpoint_ns, checkpoint_id, channel, version in self.db.query(
+            "SELECT checkpoint_ns, checkpoint_id, channel, version FROM checkpoint_blobs WHERE thread_id = ?",
+            (thread_id,),
+        ):
+            if (checkpoint_ns, checkpoint_id) in kept:
+                ref = (checkpoint_ns, channel, version)
+                self.checkpoint_refs.setdefault((thread_id, checkpoint_ns, checkpoint_id), []).append(ref)
+                refs[ref] += 1
+        for checkpoint_ns, channel, version, blob_type, value in self.db.query(
+            "SELECT checkpoint_ns, channel, version, type, value FROM blobs WHERE thread_id = ?",
+            (thread_id,),
+        ):
+            if (checkpoint_ns, channel, version) in refs:
+                self.blobs[(thread_id, checkpoint_ns, channel, version)] = (blob_type, value)
+        for checkpoint_ns, checkpoint_id, task_id, idx, channel, write_type, value, task_path in self.db.query(
+            "SELECT checkpoint_ns, checkpoint_id, task_id, idx, channel, type, value, task_path FROM writes WHERE thread_id = ?",
+            (thread_id,),
+        ):
+            if (checkpoint_ns, checkpoint_id) in kept:
+                key = (thread_id, checkpoint_ns, checkpoint_id)
+                self.writes[key][(task_id, idx)] = (task_id, channel, (write_type, value), task_path)
+                self.thread_writes[thread_id].add(key)
+        self._touch(thread_id)
+        self._evict()
+
+    def get_tuple(self, config:RunnableConfig)->CheckpointTuple|None:
+        thread_id = config["configurable"]["thread_id"]
+        with self.lock:
+            if self.shared:
+                self._drop_thread(thread_id)
+            if thread_id not in self.last_used:
+                self._load_thread(thread_id)
+            return super().get_tuple(config)
+
+    def put(
+        self,
+        config:RunnableConfig,
+        checkpoint:Checkpoint,
+        metadata:CheckpointMetadata,
+        new_versions:ChannelVersions,
+    )->RunnableConfig:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"]["checkpoint_ns"]
+        with self.lock:
+            saved = super().put(config, checkpoint, metadata, new_versions)
+            checkpoint_id = checkpoint["id"]
+            (checkpoint_type, checkpoint_b), (metadata_type, metadata_b), parent_id = (
+                self.storage[thread_id][checkpoint_ns][checkpoint_id]
+            )
+            self.db.write(
+                "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (thread_id, checkpoint_ns, checkpoint_id, checkpoint_type, checkpoint_b,
+                 metadata_type, metadata_b, parent_id, time.time()),
+            )
+            for channel, version in checkpoint["channel_versions"].items():
+                self.db.write(
+                    "INSERT OR REPLACE INTO checkpoint_blobs VALUES (?, ?, ?, ?, ?)",
+                    (thread_id, checkpoint_ns, checkpoint_id, channel, str(version)),
+                )
+            for channel, version in new_versions.items():
+                blob_type, value = self.blobs[(thread_id, checkpoint_ns, channel, version)]
+                self.db.write(
+                    "INSERT OR REPLACE INTO blobs VALUES (?, ?, ?, ?, ?, ?)",
+                    (thread_id, checkpoint_ns, channel, str(version), blob_type, value),
+                )
+            self.db.commit()
+            return saved
+
+    def put_writes(
+        self,
+        config:RunnableConfig,
+        writes:Sequence[tuple[str,Any]],
+        task_id:str,
+        task_path:str="",
+    )->None:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        with self.lock:
+            super().put_writes(config, writes, task_id, task_path)
+            for (write_task_id, idx), (_, channel, (write_type, value), path) in self.writes[
+                (thread_id, checkpoint_ns, checkpoint_id)
+            ].items():
+                if write_task_id == task_id:
+                    self.db.write(
+                        "INSERT OR REPLACE INTO writes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        (thread_id, checkpoint_ns, checkpoint_id, task_id, idx, channel, write_type, value, path),
+                    )
+            self.db.commit()
+
+    def delete_thread(self, thread_id:str)->None:
+        with self.lock:
+            super().delete_thread(thread_id)
+            for table in ("checkpoints", "checkpoint_blobs", "blobs", "writes"):
+                self.db.write(f"DELETE FROM {table} WHERE thread_id = ?", (thread_id,))
+            self.db.commit()
+
+    async def aget_tuple(self, config:RunnableConfig)->CheckpointTuple|None:
+        return await self.db.run(self.get_tuple, config)
+
+    async def aput(
+        self,
+        config:RunnableConfig,
+        checkpoint:Checkpoint,
+        metadata:CheckpointMetadata,
+        new_versions:ChannelVersions,
+    )->RunnableConfig:
+        return await self.db.run(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(
+        self,
+        config:RunnableConfig,
+        writes:Sequence[tuple[str,Any]],
+        task_id:str,
+        task_path:str="",
+    )->None:
+        await self.db.run(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id:str)->None:
+        await self.db.run(self.delete_thread, thread_id)
+
+    def compact(self, retention:float, keep:int|None=None)->int:
+        """ Drops threads idle for the retention seconds and checkpoint history deeper than keep """
+        keep = keep or self.max_checkpoints
+        removed = self.db.execute(
+            "DELETE FROM checkpoints WHERE thread_id IN ("
+            "SELECT thread_id FROM checkpoints GROUP BY thread_id HAVING MAX(created) < ?)",
+            (time.time() - retention,),
+        )
+        removed += self.db.execute(
+            "DELETE FROM checkpoints WHERE rowid IN ("
+            "SELECT rowid FROM (SELECT rowid, ROW_NUMBER() OVER ("
+            "PARTITION BY thread_id, checkpoint_ns ORDER BY checkpoint_id DESC) AS position FROM checkpoints"
+            ") WHERE position > ?)",
+            (keep,),
+        )
+        for table in ("checkpoint_blobs", "writes"):
+            self.db.execute(
+                f"DELETE FROM {table} WHERE NOT EXISTS (SELECT 1 FROM checkpoints c WHERE "
+                f"c.thread_id = {table}.thread_id AND c.checkpoint_ns = {table}.checkpoint_ns "
+                f"AND c.checkpoint_id = {table}.checkpoint_id)"
+            )
+        self.db.execute(
+            "DELETE FROM blobs WHERE NOT EXISTS (SELECT 1 FROM checkpoint_blobs r WHERE "
+            "r.thread_id = blobs.thread_id AND r.checkpoint_ns = blobs.checkpoint_ns "
+            "AND r.channel = blobs.channel AND r.version = blobs.version)"
+        )
+        return removed
+
+async def run_retention(db:SQLiteDatabase, stores:list, retention:float, interval:float):
+    """ Background compaction job, it also truncates the WAL file after each pass """
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            for store in stores:
+                removed = await db.run(store.compact, retention)
+                logger.info(f'{type(store).__name__} compaction removed {removed} rows')
+            await db.run(db.execute, "PRAGMA wal_checkpoint(TRUNCATE)")
+        except Exception as e:
+            logger.error(f'Storage compaction failed: {e}')
+
+async def main(rows:int=1_000_000, concurrency:int=64):
+    """ Benchmark of the task store, write throughput with concurrent tasks and lookup latency """
+    import os, tempfile, uuid, statistics
+    from a2a.types import TaskStatus
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    db = SQLiteDatabase(path, batch_size=1024)
+    store = SQLiteTaskStore(db)
+    ids = [str(uuid.uuid4()) for _ in range(rows)]
+
+    async def writer(chunk:list[str]):
+        for task_id in chunk:
+            await store.save(Task(id=task_id, context_id=task_id[:8], status=TaskStatus(state=TaskState.working)))
+            await asyncio.sleep(0)
+
+    started = time.perf_counter()
+    await asyncio.gather(*[writer(ids[i::concurrency]) for i in range(concurrency)])
+    await db.run(db.flush)
+    elapsed = time.perf_counter() - started
+    print(f"writes: {rows} tasks from {concurrency} concurrent writers in {elapsed:.2f}s ({rows / elapsed:,.0f}/s)")
+
+    latencies = []
+    for task_id in ids[::max(1, rows // 2000)]:
+        started = time.perf_counter()
+        await store.get(task_id)
+        latencies.append((time.perf_counter() - started) * 1000)
+    latencies.sort()
+    print(f"get by id: p50 {statistics.median(latencies):.3f}ms p99 {latencies[int(len(latencies) * 0.99)]:.3f}ms")
+    started = time.perf_counter()
+    await store.get_by_context(ids[rows // 2][:8])
+    print(f"get by context: {(time.perf_counter() - started) * 1000:.3f}ms")
+    db.close()
+
+if __name__ == "__main__":
+    import sys
+    asyncio.run(main(*(int(arg) for arg in sys.argv[1:])))
@@ -0,0 +1,67 @@
+import time
+from a2a.server.tasks import TaskUpdater
+from a2a.types import TaskState
+from a2a.utils import new_agent_text_message
+
+class StatusUpdatePolicy:
+    """ Settings for the intermediate working statuses sent by the agent executors """
+
+    def __init__(self, enabled:bool=True, interval:float=0.5, delta_only:bool=True):
+        self.enabled = enabled
+        self.interval = interval
+        self.delta_only = delta_only
+
+    def for_task(self, updater:TaskUpdater, enabled:bool=True)->"ThrottledStatusUpdater":
+        return ThrottledStatusUpdater(updater, self.enabled and enabled, self.interval, self.delta_only)
+
+class ThrottledStatusUpdater:
+    """ Merges the working statuses of one task, at most one event is sent per interval """
+
+    def __init__(self, updater:TaskUpdater, enabled:bool, interval:float, delta_only:bool):
+        self.updater = updater
+        self.enabled = enabled
+        self.interval = interval
+        self.delta_only = delta_only
+        self.last_text = ''
+        self.pending = ''
+        self.last_sent = 0.0
+        self.sent = 0
+        self.received = 0
+
+    def _delta(self, text:str)->str:
+        if not self.delta_only:
+            return text
+        if text.startswith(self.last_text):
+            return text[len(self.last_text):]
+        return text
+
+    async def push(self, text:str):
+        if not self.enabled:
+            return
+        delta = self._delta(text)
+        continues = self.delta_only and text.startswith(self.last_text) and self.last_text != ''
+        self.last_text = text
+        if not delta:
+            return
+        if self.pending and not continues:
+            self.pending += '\n'
+        self.pending += delta
+        self.received += 1
+        if time.monotonic() - self.last_sent >= self.interval:
+            await self.flush()
+
+    async def flush(self):
+        """ Sends the merged pending text, called before the final status of the task """
+        if not self.pending:
+            return
+        await self.updater.update_status(
+            TaskState.working,
+            new_agent_text_message(
+                self.pending,
+                self.updater.context_id,
+                self.updater.task_id,
+            ),
+        )
+        self.pending = ''
+        self.last_sent = time.monotonic()
+        self.sent += 1
@@ -0,0 +1,67 @@
+import asyncio
+import itertools
+import statistics
+import sys
+import time
+import uuid
+from unittest.mock import patch
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGenerationChunk
+
+class SlowFakeChatModel(GenericFakeChatModel):
+    """ Fake model producing one word every token_delay seconds, streamed or all at once """
+
+    token_delay:float = 0.02
+
+    def bind_tools(self, tools, **kwargs):
+        return self.bind()
+
+    def _generate(self, *args, **kwargs):
+        result = super()._generate(*args, **kwargs)
+        time.sleep(self.token_delay * len(result.generations[0].message.content.split()))
+        return result
+
+    def _stream(self, *args, **kwargs):
+        # The parent stream calls _generate, the words are produced here instead
+        words = next(self.messages).content.split(' ')
+        for number, word in enumerate(words):
+            time.sleep(self.token_delay)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=word if number == len(words) - 1 else word + ' '))
+
+async def main(requests:int=10, words:int=100, token_delay:float=0.02):
+    """ Time to the first answer byte of message/stream, with and without token streaming
+
+    The agent model is replaced by a fake one, so the numbers show the streaming path and not the service latency.
+    """
+    from a2a.server.request_handlers import DefaultRequestHandler
+    from a2a.server.tasks import InMemoryTaskStore
+    from a2a.types import Message, MessageSendParams, Part, Role, TaskArtifactUpdateEvent, TextPart
+    from modules.oci_client import LLM_Client
+    from agent_executor import ScienceAgentExecutor
+    answer = AIMessage(content=' '.join(f'word{number}' for number in range(words)))
+    model = SlowFakeChatModel(messages=itertools.repeat(answer), token_delay=token_delay)
+
+    for token_streaming in (False, True):
+        with patch.object(LLM_Client, 'build_llm_client', return_value=model):
+            handler = DefaultRequestHandler(
+                agent_executor=ScienceAgentExecutor(token_streaming=token_streaming), task_store=InMemoryTaskStore()
+            )
+        first_bytes:list[float] = []
+        totals:list[float] = []
+        for _ in range(requests):
+            params = MessageSendParams(message=Message(
+                role=Role.user, parts=[Part(root=TextPart(text="What is the meaning of LamBot?"))], messageId=uuid.uuid4().hex,
+            ))
+            started = time.perf_counter()
+            first_byte = None
+            async for event in handler.on_message_send_stream(params):
+                if first_byte is None and isinstance(event, TaskArtifactUpdateEvent):
+                    first_byte = time.perf_counter() - started
+            totals.append(time.perf_counter() - started)
+            first_bytes.append(first_byte)
+        mode = "token streaming" if token_streaming else "single artifact"
+        print(f"{mode:16} TTFB p50 {statistics.median(first_bytes) * 1000:8.1f}ms  total p50 {statistics.median(totals) * 1000:8.1f}ms")
+
+if __name__ == "__main__":
+    asyncio.run(main(*(int(arg) for arg in sys.argv[1:3]), *(float(arg) for arg in sys.argv[3:4])))
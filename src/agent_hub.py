@@ -1,6 +1,7 @@
 import asyncio
 import base64
 import json
+import logging
 import os
 import uuid
 import httpx
@@ -13,90 +14,274 @@ from a2a.types import (
     MessageSendParams,
     Part,
     Task,
+    TaskArtifactUpdateEvent,
     TaskState,
     TextPart,
 )
-from remote_agent_connection import RemoteAgentConnections, TaskUpdateCallback
+from a2a.utils import get_message_text, get_text_parts
+from remote_agent_connection import RemoteAgentConnections, ReplicaSet, TaskCallbackArg, TaskUpdateCallback
 from modules.oci_client import LLM_Client
+from modules.response_cache import ResponseCache
+from modules.bounded_saver import BoundedMemorySaver
+from modules.history_policy import HistoryPolicy
+from modules.http_pool import HttpPoolManager
+from modules.card_cache import AgentCardCache
+from modules.health_probe import HealthProber
+from modules.resilience import ResilienceSettings
+from modules.skill_router import SkillRouter
+from modules.card_index import CardIndex
 from collections.abc import AsyncIterable
 from typing import Any
-from langchain_core.messages import AIMessage, ToolMessage
+from langchain_core.messages import AIMessage, AnyMessage, HumanMessage, SystemMessage, ToolMessage
 from langchain_core.tools import tool
-from langgraph.checkpoint.memory import MemorySaver
+from langgraph.config import get_stream_writer
 from langgraph.prebuilt import create_react_agent
 from modules.oci_client import LLM_Client
 
 @tool
-def lang_list_remote_agents():
-    """List the available remote agents you can use to delegate the task."""
+def lang_list_remote_agents(query:str=""):
+    """List the remote agents you can use to delegate the task, pass the user query to get only the most relevant ones. Only needed when the agent catalog in your instructions is empty or misses an agent."""
     agent_hub = HostAgentHub.get_instance()
-    if not agent_hub.remote_agent_connections:
-        return []
-
-    remote_agent_info = []
-    for card in agent_hub.cards.values():
-        remote_agent_info.append(
-            {'name': card.name, 'description': card.description}
-        )
-    return remote_agent_info
+    return agent_hub.list_remote_agents(query or None)
 
 @tool
 async def send_message_2_agent(query:str,agent_name:str):
     """ Sends a message request to an agent and receives the agent response """
     agent_hub = HostAgentHub.get_instance()
+    if not agent_hub.is_available(agent_name):
+        return f"Error in response: agent {agent_name} is unavailable, try again later"
     try:
-        response = await agent_hub.remote_agent_connections[agent_name].send_message_agent(query)
+        response = await agent_hub.remote_agent_connections[agent_name].send_message_agent(query,agent_hub.task_callback)
         return response
     except Exception as e:
         return f"Error in response: {e}"
 
+@tool
+async def send_message_2_agents(query:str,agent_names:list[str]|None=None):
+    """ Sends the same message request to several agents at once (all agents when agent_names is empty) and receives every agent response """
+    agent_hub = HostAgentHub.get_instance()
+    return await agent_hub.broadcast_message(query,agent_names)
+
+logger = logging.getLogger(__name__)
+
 class HostAgentHub:
     _instance = None
     _initialized = False
 
-    def __new__(cls,remote_agent_addesses:list[str], http_client:httpx.AsyncClient):
+    def __new__(cls,remote_agent_addesses:list[str], http_client:httpx.AsyncClient|None=None):
         if cls._instance is None:
             cls._instance = super(HostAgentHub,cls).__new__(cls)
         return cls._instance
 
     SYSTEM_INSTRUCTION = (
         "You are an agent in charge of answer the user's query, order the agent responses according to relevance for the user query"
-        "ALWAYS use the function lang_list_remote_agents to know the agent names and capabilities before sending the request"
+        "The agent names and capabilities are in the agent catalog below, use lang_list_remote_agents only when the catalog is empty or misses an agent"
         "Always use both agents to answer the user and display their answers in relevance order according to the user's query"
+        "To ask several agents use send_message_2_agents in a single call, it contacts all of them at the same time"
         "If an agent gaves an error response, display the error response so the user know about it"
     )
 
-    def __init__(self, remote_agent_addesses:list[str], http_client:httpx.AsyncClient):
+    def __init__(self, remote_agent_addesses:list[str], http_client:httpx.AsyncClient|None=None):
         if not self._initialized:
-            self.httpx_client = http_client
-            self.remote_agent_connections:dict[str,RemoteAgentConnections] = {}
+            # Card lookups and every remote connection share the process wide pool by default
+            self.httpx_client = http_client or HttpPoolManager().client
+            # agent name -> connections to every replica serving that agent
+            self.remote_agent_connections:dict[str,ReplicaSet] = {}
             self.cards:dict[str,AgentCard] = {}
             self.agents:str = ''
+            # System prompt with the agent catalog, rebuilt only when the listing changes
+            self.catalog_prompt:SystemMessage|None = None
+            self.catalog_version = 0
             self.oci_client = LLM_Client()
-            self.model = self.oci_client.build_llm_client()
-            self.memory = MemorySaver()
+            self.balancing_strategy = self.oci_client.settings.load_balancing.strategy
+            discovery_settings = self.oci_client.settings.discovery
+            self.card_index = CardIndex()
+            self.shortlist_size = discovery_settings.shortlist_size
+            self.catalog_limit = discovery_settings.catalog_limit
+            self.model = self.oci_client.build_tiered_client()
+            self.memory = BoundedMemorySaver(**self.oci_client.settings.checkpointer)
+            self.history = HistoryPolicy(summary_model=self.model,**self.oci_client.settings.history)
+            cache_settings = self.oci_client.settings.response_cache
+            self.response_cache = ResponseCache(
+                max_entries=cache_settings.max_entries,
+                ttl=cache_settings.ttl,
+                disabled_agents=cache_settings.disabled_agents,
+            ) if cache_settings.enabled else None
+            self.resilience = ResilienceSettings(**self.oci_client.settings.resilience)
+            router_settings = self.oci_client.settings.fast_router
+            self.router = SkillRouter(router_settings.threshold, router_settings.log_path) if router_settings.enabled else None
+            startup_settings = self.oci_client.settings.hub_startup
+            self.card_timeout = httpx.Timeout(
+                startup_settings.card_read_timeout,
+                connect=startup_settings.card_connect_timeout,
+            )
+            self.card_deadline = startup_settings.card_deadline
+            # address -> 'pending', 'ready' or the error that made it fail
+            self.address_status:dict[str,str] = {address: 'pending' for address in remote_agent_addesses}
+            self.any_ready = asyncio.Event()
+            self.all_settled = asyncio.Event()
+            health_settings = self.oci_client.settings.health
+            self.health = HealthProber(
+                self.httpx_client,
+                interval=health_settings.interval,
+                timeout=health_settings.timeout,
+                failure_threshold=health_settings.failure_threshold,
+                recovery_threshold=health_settings.recovery_threshold,
+                on_change=lambda name, healthy: self.refresh_agents(),
+                on_round=self.retry_failed_addresses,
+            )
+            self.refresh_agents()
+            card_cache_settings = self.oci_client.settings.card_cache
+            self.card_cache = AgentCardCache(card_cache_settings.path) if card_cache_settings.enabled else None
+            if self.card_cache:
+                # Start from the cards on disk, the startup task revalidates them in the background
+                for address in remote_agent_addesses:
+                    card = self.card_cache.get(address)
+                    if card:
+                        self.register_agent_card(card, address)
+                        self.address_status[address] = 'cached'
+                        self.any_ready.set()
             HostAgentHub._initialized = True
             loop = asyncio.get_running_loop()
-            loop.create_task(self.init_remote_agent_addresses(remote_agent_addesses))
+            self.startup = loop.create_task(self.init_remote_agent_addresses(remote_agent_addesses))
+            self.health_task = loop.create_task(self.health.run()) if health_settings.enabled else None
 
     async def init_remote_agent_addresses(self,remote_agent_addresses:list[str]):
-        async with asyncio.TaskGroup() as task_group:
-            for address in remote_agent_addresses:
-                task_group.create_task(self.retrieve_card(address))
+        """ Fetches every card concurrently, a slow or dead address only affects itself """
+        await asyncio.gather(*[self.retrieve_card(address) for address in remote_agent_addresses])
+        if self.card_cache:
+            self.card_cache.save()
+            logger.info(f'Agent card cache: {self.card_cache.stats()}')
+        self.all_settled.set()
+        ready = [address for address, status in self.address_status.items() if status == 'ready']
+        logger.info(f'Hub startup finished, {len(ready)} of {len(self.address_status)} agents ready')
 
     async def retrieve_card(self, address:str):
-        card_resolver = A2ACardResolver(self.httpx_client,address)
-        card = await card_resolver.get_agent_card()
-        self.register_agent_card(card)
+        http_kwargs = {'timeout': self.card_timeout}
+        try:
+            async with asyncio.timeout(self.card_deadline):
+                if self.card_cache:
+                    card, changed = await self.card_cache.fetch(self.httpx_client, address, http_kwargs)
+                else:
+                    card_resolver = A2ACardResolver(self.httpx_client,address)
+                    card, changed = await card_resolver.get_agent_card(http_kwargs=http_kwargs), True
+        except Exception as e:
+            error = 'timeout' if isinstance(e, TimeoutError) else str(e) or type(e).__name__
+            self.address_status[address] = f'failed: {error}'
+            logger.warning(f'Agent card from {address} not available: {error}')
+            return
+        # An unchanged card keeps its connection and the tasks pending on it
+        replicas = self.remote_agent_connections.get(card.name)
+        if changed or replicas is None or address not in replicas.replicas:
+            self.register_agent_card(card, address)
+        self.address_status[address] = 'ready'
+        self.any_ready.set()
+
+    async def retry_failed_addresses(self):
+        """ Fetches again the cards of the addresses that failed, an agent started after the hub joins on a later round """
+        failed = [address for address, status in self.address_status.items() if status.startswith('failed')]
+        if not failed:
+            return
+        await asyncio.gather(*[self.retrieve_card(address) for address in failed])
+        if self.card_cache:
+            self.card_cache.save()
+
+    async def wait_ready(self, mode:str='any', timeout:float|None=None)->list[str]:
+        """ Waits until any agent is ready or until every address has settled, bounded by timeout
+        'all' with a timeout returns whatever is ready at the deadline, the rest keeps loading in the background
+        Returns the names of the agents ready so far """
+        waiters = [asyncio.ensure_future(self.all_settled.wait())]
+        if mode == 'any':
+            waiters.append(asyncio.ensure_future(self.any_ready.wait()))
+        elif mode != 'all':
+            raise ValueError(f"Unknown readiness mode {mode}, use 'any' or 'all'")
+        try:
+            await asyncio.wait(waiters, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for waiter in waiters:
+                waiter.cancel()
+        return list(self.remote_agent_connections.keys())
+
+    async def add_agent_address(self, address:str)->str:
+        """ Registers a new remote agent while the hub runs, returns the address status """
+        self.address_status[address] = 'pending'
+        await self.retrieve_card(address)
+        if self.card_cache:
+            self.card_cache.save()
+        return self.address_status[address]
 
-    def register_agent_card(self,card:AgentCard):
-        remote_connection = RemoteAgentConnections(self.httpx_client, card)
-        self.remote_agent_connections[card.name] = remote_connection
+    def register_agent_card(self,card:AgentCard,address:str|None=None):
+        """ Adds the card as a replica of its agent name, servers of the same agent share the load """
+        address = address or card.url
+        replicas = self.remote_agent_connections.get(card.name)
+        if replicas is None:
+            replicas = ReplicaSet(card.name, self.balancing_strategy, self.health.is_healthy)
+            self.remote_agent_connections[card.name] = replicas
+        replicas.add(address, RemoteAgentConnections(self.httpx_client, card, self.response_cache, self.resilience))
         self.cards[card.name] = card
+        self.card_index.add(card)
+        self.health.watch(address, address)
+        if self.router:
+            self.router.add_card(card)
+        self.refresh_agents()
+
+    def is_available(self, name:str)->bool:
+        """ An agent is available while at least one of its replicas is healthy """
+        replicas = self.remote_agent_connections.get(name)
+        return replicas is not None and replicas.is_available()
+
+    async def fast_answer(self, query:str, thread_id:str)->tuple[str,Any]|None:
+        """ Sends the query straight to the agent the skill router is confident about, skipping the planning LLM calls
+        Returns the agent name and answer, None leaves the turn to the hub agent """
+        if not self.router:
+            return None
+        healthy = {name for name in self.remote_agent_connections if self.is_available(name)}
+        name, confidence = self.router.route(query, healthy)
+        if name is None:
+            return None
+        try:
+            answer = await self.remote_agent_connections[name].send_message_agent(query, self.task_callback)
+        except Exception as e:
+            answer = f"Error in response: {e}"
+        if not RemoteAgentConnections.is_answer(answer):
+            logger.info(f'Fast route to {name} failed, the hub agent takes the turn: {answer}')
+            return None
+        logger.info(f'Fast route to {name} with confidence {confidence:.2f}')
+        # The exchange joins the thread so the next hub agent turns see it
+        await self.hub_agent.aupdate_state(
+            {"configurable": {"thread_id": thread_id}},
+            {"messages": [HumanMessage(content=query), AIMessage(content=answer)]},
+            as_node="agent",
+        )
+        return name, answer
+
+    def connection_stats(self)->dict[str,Any]:
+        """ Breaker state, latency, hedging and load counters of every replica of every remote agent """
+        return {name: connection.stats() for name, connection in self.remote_agent_connections.items()}
+
+    def refresh_agents(self):
+        """ Rebuilds the agent listing, unhealthy agents are left out until they recover """
         agent_info = []
         for remote_agent in self.list_remote_agents():
             agent_info.append(json.dumps(remote_agent))
-        self.agents = '\n'.join(agent_info)
+        agents = '\n'.join(agent_info)
+        if agents == self.agents and self.catalog_prompt is not None:
+            return
+        self.agents = agents
+        self.catalog_version += 1
+        if len(agent_info) > self.catalog_limit:
+            # A large fleet stays out of the prompt, the model asks for a shortlist instead
+            catalog = (
+                f"{len(agent_info)} agents are available, the catalog is too large to list here. "
+                "Call lang_list_remote_agents with the user query to get the most relevant agents"
+            )
+        else:
+            catalog = f"Agent catalog version {self.catalog_version}, one JSON object per agent:\n{self.agents or 'No agent is available yet'}"
+        self.catalog_prompt = SystemMessage(content=f"{self.SYSTEM_INSTRUCTION}\n{catalog}")
+
+    def prompt(self, state:dict[str,Any])->list[AnyMessage]:
+        """ Puts the precompiled catalog prompt in front of the messages kept by the history policy """
+        return [self.catalog_prompt] + state['messages']
 
     @classmethod
     def get_instance(cls):
@@ -104,25 +289,77 @@ class HostAgentHub:
             raise Exception("Host agent has not been started yet")
         return cls._instance
 
-    def list_remote_agents(self):
-        """List the available remote agents you can use to delegate the task."""
+    def task_callback(self, event:TaskCallbackArg, card:AgentCard):
+        """Forwards the remote task progress into the host graph custom stream"""
+        try:
+            writer = get_stream_writer()
+        except RuntimeError:
+            return
+        if isinstance(event, TaskArtifactUpdateEvent):
+            writer({'agent': card.name, 'state': 'artifact', 'text': ''.join(get_text_parts(event.artifact.parts))})
+            return
+        message = event.status.message
+        writer({
+            'agent': card.name,
+            'state': event.status.state.value,
+            'text': get_message_text(message) if message else '',
+        })
+
+    def list_remote_agents(self, query:str|None=None):
+        """List the available remote agents you can use to delegate the task.
+        With a query only the top BM25 matches are listed once there are more agents than the shortlist size"""
         if not self.remote_agent_connections:
             return []
 
+        cards = self.cards.values()
+        if query and len(self.cards) > self.shortlist_size:
+            healthy = {name for name in self.cards if self.is_available(name)}
+            cards = [self.cards[name] for name, _ in self.card_index.search(query, self.shortlist_size, healthy)]
         remote_agent_info = []
-        for card in self.cards.values():
+        for card in cards:
+            if not self.is_available(card.name):
+                continue
             remote_agent_info.append(
                 {'name': card.name, 'description': card.description}
             )
         return remote_agent_info
 
+    async def broadcast_message(self,query:str,agent_names:list[str]|None=None)->dict[str,Any]:
+        """Sends one query to several remote agents concurrently, responses are collected as they complete"""
+        names = agent_names or [name for name in self.remote_agent_connections if self.is_available(name)]
+
+        async def ask(name:str)->tuple[str,Any]:
+            replicas = self.remote_agent_connections.get(name)
+            if replicas is None:
+                return name, f"Error in response: agent {name} not found"
+            if not replicas.is_available():
+                return name, f"Error in response: agent {name} is unavailable, try again later"
+            connection = replicas.pick()
+            # Streaming connections already time out between events, long answers are not cut
+            timeout = None if connection.card.capabilities.streaming else connection.timeout
+            try:
+                response = await asyncio.wait_for(connection.send_message_agent(query,self.task_callback),timeout=timeout)
+                return name, response
+            except TimeoutError:
+                connection.record_timeout(timeout)
+                return name, f"Error in response: {name} did not answer in {timeout:.1f}s"
+            except Exception as e:
+                return name, f"Error in response: {e}"
+
+        responses:dict[str,Any] = {}
+        for finished in asyncio.as_completed([ask(name) for name in names]):
+            name, response = await finished
+            responses[name] = response
+        return responses
+
     def create_agent(self):
-        self.tools = [lang_list_remote_agents, send_message_2_agent]
+        self.tools = [lang_list_remote_agents, send_message_2_agent, send_message_2_agents]
         self.hub_agent = create_react_agent(
             model=self.model,
             tools=self.tools,
             checkpointer=self.memory,
-            prompt=self.SYSTEM_INSTRUCTION
+            prompt=self.prompt,
+            pre_model_hook=self.history.trim
         )
 
     
\ No newline at end of file
@@ -1,7 +1,8 @@
 import asyncio
-import httpx
 import logging
+from uuid import uuid4
 from agent_hub import HostAgentHub
+from modules.http_pool import HttpPoolManager
 
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(name=f"Agent.{__name__}")
@@ -29,39 +30,73 @@ def stream_updates(user_input: str) -> str:
 
 async def main():
     # Add all remote server address, also the VM
+    # Servers publishing the same agent name are load balanced as replicas
     remote_addresses = [
         "http://localhost:9999/",
         "http://localhost:8888/"
     ]
 
-    async with httpx.AsyncClient(timeout=10.0) as http_client:
+    pool = HttpPoolManager()
+    async with pool.client as http_client:
         host = HostAgentHub(remote_addresses, http_client)
         host.create_agent()
 
-        # Wait until all agents are initialized
-        while not host.remote_agent_connections:
-            await asyncio.sleep(0.1)
+        # Start as soon as the readiness mode allows, late agents keep registering in the background
+        startup = host.oci_client.settings.hub_startup
+        ready = await host.wait_ready(startup.ready, startup.ready_timeout)
+        logger.info(f"Agents ready: {ready}, addresses: {host.address_status}")
 
+        # One conversation thread per session, the history policy keeps its prompt bounded
+        session_id = uuid4().hex
         while True:
             try:
                 user_input = input("USER: ")
                 if user_input.lower() in ["quit", "exit", "q"]:
                     print("Goodbye!")
                     break
+                if user_input.startswith("/add "):
+                    # Registers another agent server without restarting the hub
+                    status = await host.add_agent_address(user_input[5:].strip())
+                    print(f"Agent address {status}")
+                    continue
+                fast = await host.fast_answer(user_input, session_id)
+                if fast:
+                    # The skill router was confident, the hub agent LLM calls were skipped
+                    agent_name, answer = fast
+                    print(f"MODEL RESPONSE ({agent_name})")
+                    print(answer)
+                    continue
                 final_response = []
-                async for chunk in host.hub_agent.astream( {"messages": [{"role": "user", "content": user_input}]},
-                    {"configurable": {"thread_id": "1"}},
-                    stream_mode="values",
+                async for namespace, mode, chunk in host.hub_agent.astream( {"messages": [{"role": "user", "content": user_input}]},
+                    {"configurable": {"thread_id": session_id}},
+                    stream_mode=["values","custom"],
                     subgraphs=True
                 ):
+                    if mode == "custom":
+                        # Remote agent progress forwarded by HostAgentHub.task_callback
+                        if chunk['state'] == 'artifact':
+                            print(chunk['text'], end='', flush=True)
+                        else:
+                            print(f"[{chunk['agent']}] {chunk['state']}: {chunk['text']}")
+                        continue
                     logger.debug("Chunk response ==========")
-                    logger.debug(chunk[-1]['messages'][-1])
+                    logger.debug(chunk['messages'][-1])
                     try:
-                        final_response.append(chunk[-1]['messages'][-1].content)
+                        final_response.append(chunk['messages'][-1].content)
                     except Exception as p:
                         final_response.append(f"Error in response: {p}")
                 print("MODEL RESPONSE")
                 print(final_response[-1])
+                logger.debug(f"History policy: {host.history.stats()}")
+                logger.debug(f"HTTP pool: {pool.stats()}")
+                logger.debug(f"Agent health: {host.health.stats()}")
+                logger.debug(f"Agent connections: {host.connection_stats()}")
+                if host.router:
+                    logger.debug(f"Skill router: {host.router.stats()}")
+                if host.oci_client.tiered:
+                    logger.debug(f"Model tiers: {host.oci_client.tiered.stats()}")
+                if host.oci_client.rate_limiter:
+                    logger.debug(f"LLM rate limiter: {host.oci_client.rate_limiter.stats()}")
             except Exception as e:
                 logger.info(f'General error: {e}')
 
@@ -2,13 +2,17 @@ from collections.abc import AsyncIterable
 from typing import Any
 from langchain_core.messages import AIMessage, ToolMessage
 from langchain_core.tools import tool
-from langgraph.checkpoint.memory import MemorySaver
 from langgraph.prebuilt import create_react_agent
 from modules.fuse_config import FuseConfig
 from modules.oci_client import LLM_Client
-import logging, httpx
+from modules.bounded_saver import BoundedMemorySaver
+from modules.http_pool import HttpPoolManager
+from modules.card_cache import AgentCardCache
+from modules.resilience import ResilienceSettings
+from modules.latency import AdaptiveTimeout
+import logging, time
 from uuid import uuid4
-from a2a.client import A2ACardResolver, A2AClient
+from a2a.client import A2AClient, A2AClientTimeoutError
 from a2a.types import (
     AgentCard,
     MessageSendParams,
@@ -19,7 +23,7 @@ from a2a.types import (
 oci_client = LLM_Client()
 fuse_handler = FuseConfig()
 id = fuse_handler.generate_id()
-memory = MemorySaver()
+memory = BoundedMemorySaver(**oci_client.settings.checkpointer)
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__) 
@@ -28,27 +32,43 @@ class RemoteConnections():
 
     def __init__(self):
         self.servers:dict[str,A2AClient] = {}
-        self.timeout = 30.0
         self.ports = [9999,8888]
+        self.card_cache = AgentCardCache(oci_client.settings.card_cache.path)
+        self.resilience = ResilienceSettings(**oci_client.settings.resilience)
+        self.latencies:dict[str,AdaptiveTimeout] = {}
+
+    def latency_for(self, agent_name:str)->AdaptiveTimeout:
+        """ Latency histogram and adaptive timeout of one server, created on first use """
+        if agent_name not in self.latencies:
+            policy = self.resilience.for_agent(agent_name)
+            self.latencies[agent_name] = AdaptiveTimeout(
+                default=policy['timeout'],
+                factor=policy['timeout_factor'],
+                floor=policy['timeout_floor'],
+                ceiling=policy['timeout_ceiling'],
+                min_samples=policy['timeout_min_samples'],
+            )
+        return self.latencies[agent_name]
     
     async def connect_server(self,base_url):
-        async with httpx.AsyncClient() as httpx_client:
-            resolver = A2ACardResolver(httpx_client,base_url)
-            final_agent_card_use: AgentCard | None = None
-
-            try:
-                _public_card = await resolver.get_agent_card()
-                final_agent_card_use = _public_card
-                logger.info('\nUsing PUBLIC agent card for client initialization (default).')
-            except Exception as e:
-                logger.error(f'Critical error fetching public agent card: {e}', exc_info=True)
-                raise RuntimeError('Failed to fetch the public agent card. Cannot continue.') from e
-            
-            client = A2AClient(httpx_client,final_agent_card_use)
-            name = str(final_agent_card_use.name)
-            logger.info(f'A2AClient initialized: {name}')
+        # The pooled client outlives this call, the A2AClient keeps using it for every request
+        httpx_client = HttpPoolManager().client
+        final_agent_card_use: AgentCard | None = None
 
-            return name, client
+        try:
+            # Revalidates the card stored on disk, an unchanged card is answered with a 304
+            _public_card, _ = await self.card_cache.fetch(httpx_client,base_url)
+            final_agent_card_use = _public_card
+            logger.info('\nUsing PUBLIC agent card for client initialization (default).')
+        except Exception as e:
+            logger.error(f'Critical error fetching public agent card: {e}', exc_info=True)
+            raise RuntimeError('Failed to fetch the public agent card. Cannot continue.') from e
+        
+        client = A2AClient(httpx_client,final_agent_card_use)
+        name = str(final_agent_card_use.name)
+        logger.info(f'A2AClient initialized: {name}')
+
+        return name, client
 
     async def start_servers(self):
         host = 'localhost'
@@ -56,6 +76,7 @@ class RemoteConnections():
             url=f"http://{host}:{port}/"
             name, client = await self.connect_server(url)
             self.servers[name] = client
+        self.card_cache.save()
 
     async def send_message_agent(self, agent_name:str, user_input:str)-> Any:
         client = self.servers[agent_name]
@@ -71,7 +92,15 @@ class RemoteConnections():
         request = SendMessageRequest(
             id=str(uuid4()), params=MessageSendParams(**send_message_payload)
         )
-        response = await client.send_message(request, http_kwargs={"timeout": self.timeout})
+        latency = self.latency_for(agent_name)
+        started = time.perf_counter()
+        try:
+            response = await client.send_message(request, http_kwargs={"timeout": latency.value})
+        except A2AClientTimeoutError:
+            # Timed out calls are recorded too, so a too short timeout grows back
+            latency.record(time.perf_counter() - started)
+            raise
+        latency.record(time.perf_counter() - started)
         final_text = response.model_dump(mode='json', exclude_none=True)
         return final_text
 
@@ -117,7 +146,7 @@ class HostAgent:
     )
 
     def __init__(self):
-        self.model = oci_client.build_llm_client()
+        self.model = oci_client.build_tiered_client()
         self.tools = [list_remote_agents,send_message]
         self.host_agent = create_react_agent(
             model=self.model,
@@ -178,6 +207,9 @@ async def main():
     print(response)
     response = await remote_connection.send_message_agent("Science agent","Who was nikola tesla?")
     print(response)
+    print({name: latency.stats() for name, latency in remote_connection.latencies.items()})
+    print(HttpPoolManager().stats())
+    await HttpPoolManager().aclose()
 
 if __name__ == '__main__':
     import asyncio
@@ -0,0 +1,90 @@
+import json
+import logging
+import os
+import time
+from typing import Any
+import httpx
+from a2a.types import AgentCard
+from a2a.utils.constants import AGENT_CARD_WELL_KNOWN_PATH
+
+logger = logging.getLogger(__name__)
+
+class AgentCardCache:
+    """ Agent cards kept on local disk by address, revalidated with If-None-Match / If-Modified-Since
+
+    A 304 answer reuses the stored card, only changed cards are parsed and written again.
+    """
+
+    def __init__(self, path:str="agent_cards.json"):
+        self.path = path
+        # address -> {'card', 'etag', 'last_modified', 'checked'}
+        self.entries:dict[str,dict[str,Any]] = {}
+        self.cards:dict[str,AgentCard] = {}
+        self.dirty = False
+        self.hits = 0
+        self.misses = 0
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.path, encoding='utf-8') as file:
+                self.entries = json.load(file)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logger.warning(f'Agent card cache {self.path} ignored: {e}')
+            self.entries = {}
+
+    def save(self):
+        """ Writes the cache atomically, only when a card changed since the last save """
+        if not self.dirty:
+            return
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            json.dump(self.entries, file)
+        os.replace(temp_path, self.path)
+        self.dirty = False
+
+    def get(self, address:str)->AgentCard|None:
+        if address not in self.cards:
+            entry = self.entries.get(address)
+            if entry is None:
+                return None
+            self.cards[address] = AgentCard.model_validate(entry['card'])
+        return self.cards[address]
+
+    async def fetch(self, client:httpx.AsyncClient, address:str, http_kwargs:dict[str,Any]|None=None)->tuple[AgentCard,bool]:
+        """ Returns the current card of the address and whether it changed from the cached one """
+        url = f"{address.rstrip('/')}{AGENT_CARD_WELL_KNOWN_PATH}"
+        entry = self.entries.get(address)
+        headers = {}
+        if entry and entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry and entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        response = await client.get(url, headers=headers, **(http_kwargs or {}))
+        if response.status_code == 304 and entry:
+            self.hits += 1
+            entry['checked'] = time.time()
+            return self.get(address), False
+        response.raise_for_status()
+        self.misses += 1
+        data = response.json()
+        card = AgentCard.model_validate(data)
+        changed = entry is None or entry['card'] != data
+        self.entries[address] = {
+            'card': data,
+            'etag': response.headers.get('etag'),
+            'last_modified': response.headers.get('last-modified'),
+            'checked': time.time(),
+        }
+        self.cards[address] = card
+        self.dirty = True
+        return card, changed
+
+    def stats(self)->dict[str,Any]:
+        return {
+            'cards': len(self.entries),
+            'not_modified': self.hits,
+            'downloaded': self.misses,
+        }
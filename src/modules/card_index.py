@@ -0,0 +1,126 @@
+import json
+import math
+import random
+import statistics
+import time
+from collections import Counter, defaultdict
+from a2a.types import AgentCapabilities, AgentCard, AgentSkill
+from modules.skill_router import tokenize
+
+class CardIndex:
+    """ BM25 index over the agent card names, descriptions and skills, updated one card at a time """
+
+    def __init__(self, k1:float=1.5, b:float=0.75):
+        self.k1 = k1
+        self.b = b
+        # term -> agent name -> term frequency
+        self.postings:defaultdict[str,dict[str,int]] = defaultdict(dict)
+        self.lengths:dict[str,int] = {}
+        self.terms:dict[str,list[str]] = {}
+        self.total_length = 0
+
+    @staticmethod
+    def card_text(card:AgentCard)->str:
+        parts = [card.name, card.description]
+        for skill in card.skills:
+            parts += [skill.name, skill.description, *skill.tags, *(skill.examples or [])]
+        return ' '.join(parts)
+
+    def add(self, card:AgentCard):
+        self.remove(card.name)
+        terms = Counter(tokenize(self.card_text(card)))
+        for term, frequency in terms.items():
+            self.postings[term][card.name] = frequency
+        length = sum(terms.values())
+        self.lengths[card.name] = length
+        self.terms[card.name] = list(terms)
+        self.total_length += length
+
+    def remove(self, name:str):
+        length = self.lengths.pop(name, None)
+        if length is None:
+            return
+        self.total_length -= length
+        for term in self.terms.pop(name):
+            del self.postings[term][name]
+            if not self.postings[term]:
+                del self.postings[term]
+
+    def search(self, query:str, limit:int=5, allowed:set[str]|None=None)->list[tuple[str,float]]:
+        """ Best agents for the query with their BM25 score, agents without any query term are left out """
+        count = len(self.lengths)
+        if not count:
+            return []
+        average_length = self.total_length / count
+        scores:defaultdict[str,float] = defaultdict(float)
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for name, frequency in postings.items():
+                if allowed is not None and name not in allowed:
+                    continue
+                norm = self.k1 * (1 - self.b + self.b * self.lengths[name] / average_length)
+                scores[name] += idf * frequency * (self.k1 + 1) / (frequency + norm)
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:limit]
+
+TOPICS = [
+    ("poems", ["poem", "rhyme", "verse"]), ("science", ["physics", "chemistry", "definition"]),
+    ("travel", ["flight", "hotel", "itinerary"]), ("finance", ["invoice", "budget", "tax"]),
+    ("weather", ["forecast", "rain", "temperature"]), ("cooking", ["recipe", "ingredient", "oven"]),
+    ("legal", ["contract", "clause", "compliance"]), ("health", ["symptom", "diet", "exercise"]),
+    ("code", ["python", "bug", "refactor"]), ("music", ["song", "chord", "playlist"]),
+]
+
+def synthetic_card(number:int)->AgentCard:
+    topic, words = TOPICS[number % len(TOPICS)]
+    skill = AgentSkill(
+        id=f"skill_{number}",
+        name=f"{topic.title()} helper {number}",
+        description=f"Answers {topic} questions about {' and '.join(words)}",
+        tags=[topic, random.choice(words)],
+        examples=[f"Help me with a {random.choice(words)} for {topic}"],
+    )
+    return AgentCard(
+        name=f"{topic.title()} agent {number}",
+        description=f"Helps the user with {topic} tasks, {', '.join(words)}",
+        url=f"http://agent{number}:8000/",
+        version="1.0.0",
+        default_input_modes=['text'],
+        default_output_modes=['text'],
+        capabilities=AgentCapabilities(streaming=True),
+        skills=[skill],
+    )
+
+def main(limit:int=5, queries:int=200):
+    """ Compares the full agent listing with the BM25 shortlist at several fleet sizes """
+    random.seed(0)
+    for agents in (10, 100, 1000):
+        index = CardIndex()
+        cards = [synthetic_card(number) for number in range(agents)]
+        started = time.perf_counter()
+        for card in cards:
+            index.add(card)
+        add_time = (time.perf_counter() - started) / agents
+        descriptions = {card.name: card.description for card in cards}
+        full_listing = json.dumps([{'name': name, 'description': description} for name, description in descriptions.items()])
+        latencies = []
+        shortlist = ''
+        for _ in range(queries):
+            topic, words = random.choice(TOPICS)
+            query = f"Can you write a {random.choice(words)} about {topic}?"
+            started = time.perf_counter()
+            names = [name for name, _ in index.search(query, limit)]
+            latencies.append(time.perf_counter() - started)
+            shortlist = json.dumps([{'name': name, 'description': descriptions[name]} for name in names])
+        # Tokens are estimated at 4 characters each
+        print(
+            f"{agents:5d} agents | full listing {len(full_listing) // 4:6d} tokens"
+            f" | shortlist {len(shortlist) // 4:4d} tokens"
+            f" | search p50 {statistics.median(latencies) * 1000:.3f}ms p99 {sorted(latencies)[int(queries * 0.99) - 1] * 1000:.3f}ms"
+            f" | add {add_time * 1000:.3f}ms/card"
+        )
+
+if __name__ == "__main__":
+    main()
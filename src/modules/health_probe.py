@@ -0,0 +1,117 @@
+import asyncio
+import logging
+import time
+from collections.abc import Awaitable, Callable
+from typing import Any
+import httpx
+from a2a.utils.constants import AGENT_CARD_WELL_KNOWN_PATH
+
+logger = logging.getLogger(__name__)
+
+class AgentHealth:
+    """ Liveness and probe latency of one remote agent """
+
+    def __init__(self, address:str):
+        self.address = address
+        self.healthy = True
+        self.failures = 0
+        self.successes = 0
+        self.latency:float|None = None
+        self.last_checked = 0.0
+        self.last_error = ''
+
+class HealthProber:
+    """ Probes the agent card endpoint of every watched agent in the background
+
+    An agent turns unhealthy after failure_threshold failed probes in a row and healthy again
+    after recovery_threshold good ones, on_change is called on every transition.
+    on_round runs after every probe round, the hub retries there the addresses whose card never loaded.
+    """
+
+    def __init__(
+        self,
+        client:httpx.AsyncClient,
+        interval:float=10.0,
+        timeout:float=2.0,
+        failure_threshold:int=2,
+        recovery_threshold:int=1,
+        on_change:Callable[[str,bool],None]|None=None,
+        on_round:Callable[[],Awaitable[Any]]|None=None,
+    ):
+        self.client = client
+        self.interval = interval
+        self.timeout = timeout
+        self.failure_threshold = failure_threshold
+        self.recovery_threshold = recovery_threshold
+        self.on_change = on_change
+        self.on_round = on_round
+        self.agents:dict[str,AgentHealth] = {}
+        self.probes = 0
+
+    def watch(self, name:str, address:str):
+        health = self.agents.get(name)
+        if health is None:
+            self.agents[name] = AgentHealth(address)
+        else:
+            health.address = address
+
+    def forget(self, name:str):
+        self.agents.pop(name, None)
+
+    def is_healthy(self, name:str)->bool:
+        health = self.agents.get(name)
+        return health is None or health.healthy
+
+    async def probe(self, name:str):
+        health = self.agents[name]
+        started = time.perf_counter()
+        try:
+            response = await self.client.head(
+                f"{health.address.rstrip('/')}{AGENT_CARD_WELL_KNOWN_PATH}", timeout=self.timeout
+            )
+            ok = response.status_code < 500
+            health.last_error = '' if ok else f'HTTP {response.status_code}'
+        except httpx.HTTPError as e:
+            ok = False
+            health.last_error = str(e) or type(e).__name__
+        self.probes += 1
+        health.last_checked = time.time()
+        if ok:
+            elapsed = time.perf_counter() - started
+            health.latency = elapsed if health.latency is None else 0.8 * health.latency + 0.2 * elapsed
+            health.successes += 1
+            health.failures = 0
+            changed = not health.healthy and health.successes >= self.recovery_threshold
+        else:
+            health.failures += 1
+            health.successes = 0
+            changed = health.healthy and health.failures >= self.failure_threshold
+        if changed:
+            health.healthy = not health.healthy
+            logger.warning(f"Agent {name} is {'healthy' if health.healthy else 'unhealthy'} {health.last_error}")
+            if self.on_change:
+                self.on_change(name, health.healthy)
+
+    async def probe_all(self):
+        await asyncio.gather(*[self.probe(name) for name in list(self.agents)])
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.probe_all()
+                if self.on_round:
+                    await self.on_round()
+            except Exception as e:
+                logger.error(f'Health probe round failed: {e}')
+
+    def stats(self)->dict[str,Any]:
+        return {
+            name: {
+                'healthy': health.healthy,
+                'latency': health.latency,
+                'failures': health.failures,
+                'last_error': health.last_error,
+            }
+            for name, health in self.agents.items()
+        }
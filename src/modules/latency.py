@@ -0,0 +1,79 @@
+import math
+from typing import Any
+
+class LatencyHistogram:
+    """ HDR style latency histogram with log spaced buckets
+
+    Every bucket is within precision of the values it holds, memory is fixed whatever the number of samples.
+    Counts are halved every decay_every samples so the percentiles follow recent behavior.
+    """
+
+    def __init__(self, min_value:float=0.001, max_value:float=600.0, precision:float=0.05, decay_every:int=1000):
+        self.min_value = min_value
+        self.growth = math.log1p(precision)
+        self.counts = [0.0] * (int(math.log(max_value / min_value) / self.growth) + 2)
+        self.decay_every = decay_every
+        self.total = 0.0
+        self.recorded = 0
+
+    def index(self, value:float)->int:
+        if value <= self.min_value:
+            return 0
+        return min(len(self.counts) - 1, int(math.log(value / self.min_value) / self.growth) + 1)
+
+    def record(self, value:float):
+        self.counts[self.index(value)] += 1
+        self.total += 1
+        self.recorded += 1
+        if self.decay_every and self.recorded % self.decay_every == 0:
+            self.counts = [count / 2 for count in self.counts]
+            self.total = sum(self.counts)
+
+    def percentile(self, percent:float)->float|None:
+        """ Upper bound of the bucket holding the percentile, None without samples """
+        if not self.total:
+            return None
+        rank = math.ceil(self.total * percent / 100)
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                return self.min_value * math.exp(self.growth * index)
+        return self.min_value * math.exp(self.growth * (len(self.counts) - 1))
+
+    def percentiles(self)->dict[str,float|None]:
+        return {f'p{percent}': self.percentile(percent) for percent in (50, 90, 95, 99)}
+
+class AdaptiveTimeout:
+    """ Timeout derived from the latency histogram: p99 x factor clamped to [floor, ceiling]
+
+    The default is used until min_samples calls were recorded.
+    """
+
+    def __init__(
+        self,
+        default:float=30.0,
+        factor:float=2.0,
+        floor:float=5.0,
+        ceiling:float=120.0,
+        min_samples:int=20,
+        histogram:LatencyHistogram|None=None,
+    ):
+        self.default = default
+        self.factor = factor
+        self.floor = floor
+        self.ceiling = ceiling
+        self.min_samples = min_samples
+        self.histogram = histogram or LatencyHistogram()
+
+    def record(self, elapsed:float):
+        self.histogram.record(elapsed)
+
+    @property
+    def value(self)->float:
+        if self.histogram.total < self.min_samples:
+            return self.default
+        return min(self.ceiling, max(self.floor, self.histogram.percentile(99) * self.factor))
+
+    def stats(self)->dict[str,Any]:
+        return {'timeout': self.value, 'samples': self.histogram.recorded, **self.histogram.percentiles()}
@@ -0,0 +1,98 @@
+import time
+from collections import deque
+from typing import Any
+
+class CircuitBreaker:
+    """ Closed, open and half open breaker for one remote agent
+
+    Errors and calls slower than slow_call count as failures, the breaker opens when the failure rate
+    of the last window calls reaches failure_rate. After open_time one trial call is let through.
+    Callers pass the time to the first streamed event as elapsed, not the length of the whole answer.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_rate:float=0.5, slow_call:float=20.0, window:int=20, min_calls:int=5, open_time:float=30.0):
+        self.failure_rate = failure_rate
+        self.slow_call = slow_call
+        self.min_calls = min_calls
+        self.open_time = open_time
+        self.results:deque[bool] = deque(maxlen=window)
+        self.state = self.CLOSED
+        self.opened_at = 0.0
+        self.trial_running = False
+        self.rejected = 0
+        self.opened = 0
+
+    def retry_in(self)->float:
+        return max(0.0, self.opened_at + self.open_time - time.monotonic())
+
+    def allow(self)->bool:
+        if self.state == self.OPEN and self.retry_in() == 0:
+            self.state = self.HALF_OPEN
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.HALF_OPEN and not self.trial_running:
+            self.trial_running = True
+            return True
+        self.rejected += 1
+        return False
+
+    def record(self, success:bool, elapsed:float):
+        failed = not success or elapsed >= self.slow_call
+        if self.state == self.HALF_OPEN:
+            self.trial_running = False
+            if failed:
+                self._open()
+            else:
+                self.state = self.CLOSED
+                self.results.clear()
+            return
+        self.results.append(not failed)
+        if len(self.results) >= self.min_calls:
+            failures = self.results.count(False)
+            if failures / len(self.results) >= self.failure_rate:
+                self._open()
+
+    def _open(self):
+        self.state = self.OPEN
+        self.opened_at = time.monotonic()
+        self.opened += 1
+        self.results.clear()
+
+    def stats(self)->dict[str,Any]:
+        return {
+            'state': self.state,
+            'opened': self.opened,
+            'rejected': self.rejected,
+            'retry_in': self.retry_in() if self.state == self.OPEN else 0.0,
+        }
+
+class ResilienceSettings:
+    """ Breaker, hedging and timeout settings, the default section is overridden per card name """
+
+    DEFAULTS = {
+        'breaker': True,
+        'failure_rate': 0.5,
+        'slow_call': 20.0,
+        'window': 20,
+        'min_calls': 5,
+        'open_time': 30.0,
+        'hedge': False,
+        'hedge_percentile': 95,
+        'hedge_min_samples': 20,
+        'timeout': 30.0,
+        'timeout_factor': 2.0,
+        'timeout_floor': 5.0,
+        'timeout_ceiling': 120.0,
+        'timeout_min_samples': 20,
+    }
+
+    def __init__(self, default:dict[str,Any]|None=None, agents:dict[str,dict[str,Any]]|None=None):
+        self.default = {**self.DEFAULTS, **(default or {})}
+        self.agents = agents or {}
+
+    def for_agent(self, name:str)->dict[str,Any]:
+        return {**self.default, **self.agents.get(name, {})}
@@ -0,0 +1,59 @@
+import time
+from collections import OrderedDict
+from typing import Any
+from a2a.types import AgentCard
+
+class ResponseCache:
+    """ LRU cache with TTL for the answers of the remote agents """
+
+    def __init__(self, max_entries:int=256, ttl:float=300.0, disabled_agents:list[str]|None=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.disabled_agents = set(disabled_agents or [])
+        self.entries:OrderedDict[tuple[str,str,str],tuple[float,Any]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def normalize(query:str)->str:
+        return ' '.join(query.lower().split())
+
+    def key(self, card:AgentCard, query:str)->tuple[str,str,str]:
+        return (card.name, card.version, self.normalize(query))
+
+    def enabled_for(self, card:AgentCard)->bool:
+        return card.name not in self.disabled_agents
+
+    def get(self, card:AgentCard, query:str)->Any|None:
+        key = self.key(card, query)
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires, answer = entry
+        if expires < time.monotonic():
+            del self.entries[key]
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return answer
+
+    def put(self, card:AgentCard, query:str, answer:Any):
+        key = self.key(card, query)
+        self.entries[key] = (time.monotonic() + self.ttl, answer)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self)->dict[str,Any]:
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self.entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
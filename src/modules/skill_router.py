@@ -0,0 +1,145 @@
+import json
+import logging
+import math
+import re
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+from a2a.types import AgentCard
+
+logger = logging.getLogger(__name__)
+
+STOP_WORDS = {
+    'a', 'an', 'and', 'are', 'about', 'as', 'at', 'be', 'by', 'can', 'do', 'for', 'from', 'give', 'help', 'helps',
+    'how', 'i', 'in', 'is', 'it', 'me', 'my', 'of', 'on', 'or', 'please', 'the', 'this', 'to', 'user', 'want',
+    'what', 'who', 'with', 'you',
+}
+
+def tokenize(text:str)->list[str]:
+    """ Lower case word stems without stop words, the suffix stripping is crude but stable """
+    terms = []
+    for word in re.findall(r"[a-z0-9]+", text.lower()):
+        if word in STOP_WORDS:
+            continue
+        if len(word) > 4 and word.endswith('ies'):
+            word = word[:-3] + 'y'
+        elif len(word) > 5 and word.endswith('ing'):
+            word = word[:-3]
+        elif len(word) > 3 and word.endswith('s') and not word.endswith('ss'):
+            word = word[:-1]
+        terms.append(word)
+    return terms
+
+class SkillRouter:
+    """ Inverted index over the agent cards that routes obvious queries without the host LLM
+
+    Each term of a card is weighted by the field it comes from and by its rarity across agents. The confidence of
+    a route is the share of the best agent in the total score times the share of query terms it matched.
+    With a log_path every decision is appended there as a JSON line by a writer thread, the event loop never waits for the file.
+    """
+
+    FIELD_WEIGHTS = {'tags': 3.0, 'skill_name': 2.0, 'examples': 1.5, 'name': 1.0, 'description': 1.0}
+
+    def __init__(self, threshold:float=0.5, log_path:str|None=None):
+        self.threshold = threshold
+        self.log_path = log_path
+        # One worker keeps the lines in decision order
+        self.writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="router-log") if log_path else None
+        # term -> agent name -> field weight
+        self.index:defaultdict[str,dict[str,float]] = defaultdict(dict)
+        self.agent_terms:dict[str,set[str]] = {}
+        self.routed = 0
+        self.fallbacks = 0
+
+    def add_card(self, card:AgentCard):
+        self.remove_card(card.name)
+        fields = {
+            'name': [card.name],
+            'description': [card.description],
+            'tags': [tag for skill in card.skills for tag in skill.tags],
+            'skill_name': [skill.name for skill in card.skills],
+            'examples': [example for skill in card.skills for example in skill.examples or []],
+        }
+        fields['description'] += [skill.description for skill in card.skills]
+        terms = set()
+        for field, texts in fields.items():
+            for text in texts:
+                for term in tokenize(text):
+                    weight = self.FIELD_WEIGHTS[field]
+                    if self.index[term].get(card.name, 0.0) < weight:
+                        self.index[term][card.name] = weight
+                    terms.add(term)
+        self.agent_terms[card.name] = terms
+
+    def remove_card(self, name:str):
+        for term in self.agent_terms.pop(name, ()):
+            self.index[term].pop(name, None)
+            if not self.index[term]:
+                del self.index[term]
+
+    def scores(self, query:str, allowed:set[str]|None=None)->tuple[dict[str,float],dict[str,int],int]:
+        """ Agent scores, matched query terms per agent and the number of query terms """
+        terms = tokenize(query)
+        agents = len(self.agent_terms)
+        scores:defaultdict[str,float] = defaultdict(float)
+        matched:defaultdict[str,int] = defaultdict(int)
+        for term in terms:
+            postings = self.index.get(term)
+            if not postings:
+                continue
+            idf = math.log((agents + 1) / len(postings))
+            for name, weight in postings.items():
+                if allowed is not None and name not in allowed:
+                    continue
+                scores[name] += weight * idf
+                matched[name] += 1
+        return dict(scores), dict(matched), len(terms)
+
+    def route(self, query:str, allowed:set[str]|None=None)->tuple[str|None,float]:
+        """ Returns the agent to call directly and the confidence, no agent when it is below the threshold """
+        scores, matched, term_count = self.scores(query, allowed)
+        agent, confidence = None, 0.0
+        total = sum(scores.values())
+        if total > 0:
+            best = max(scores, key=scores.get)
+            confidence = scores[best] / total * matched[best] / term_count
+            if confidence >= self.threshold:
+                agent = best
+        if agent:
+            self.routed += 1
+        else:
+            self.fallbacks += 1
+        self.log_decision(query, agent, confidence, scores)
+        return agent, confidence
+
+    def log_decision(self, query:str, agent:str|None, confidence:float, scores:dict[str,float]):
+        """ One JSON line per decision, kept to audit the router precision offline """
+        if not self.log_path:
+            return
+        record = {
+            'time': time.time(),
+            'query': query,
+            'agent': agent,
+            'confidence': round(confidence, 4),
+            'threshold': self.threshold,
+            'scores': {name: round(score, 4) for name, score in scores.items()},
+        }
+        self.writer.submit(self._write_line, json.dumps(record) + '\n')
+
+    def _write_line(self, line:str):
+        try:
+            with open(self.log_path, 'a', encoding='utf-8') as file:
+                file.write(line)
+        except OSError as e:
+            logger.warning(f'Router decision not logged: {e}')
+
+    def stats(self)->dict[str,Any]:
+        decisions = self.routed + self.fallbacks
+        return {
+            'agents': len(self.agent_terms),
+            'terms': len(self.index),
+            'routed': self.routed,
+            'fallbacks': self.fallbacks,
+            'routed_rate': self.routed / decisions if decisions else 0.0,
+        }
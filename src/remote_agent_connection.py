@@ -1,12 +1,18 @@
+import asyncio
+import logging
+import random
+import time
 from collections.abc import Callable
 from uuid import uuid4
 
 import httpx
 from typing import Any
 
-from a2a.client import A2AClient
+from a2a.client import A2AClient, A2AClientTimeoutError
 from a2a.types import (
+    AgentCapabilities,
     AgentCard,
+    CancelTaskRequest,
     JSONRPCErrorResponse,
     Message,
     MessageSendParams,
@@ -14,22 +20,71 @@ from a2a.types import (
     SendStreamingMessageRequest,
     Task,
     TaskArtifactUpdateEvent,
+    TaskIdParams,
+    TaskState,
     TaskStatusUpdateEvent,
 )
 
-from a2a.client import A2ACardResolver, A2AClient
+from a2a.utils import append_artifact_to_task, get_message_text, get_text_parts
+from modules.response_cache import ResponseCache
+from modules.http_pool import HttpPoolManager
+from modules.card_cache import AgentCardCache
+from modules.resilience import CircuitBreaker, ResilienceSettings
+from modules.latency import AdaptiveTimeout
+
+logger = logging.getLogger(__name__)
 
 TaskCallbackArg = Task | TaskStatusUpdateEvent | TaskArtifactUpdateEvent
 TaskUpdateCallback = Callable[[TaskCallbackArg, AgentCard], Task]
+FAILED_STATES = (TaskState.failed, TaskState.rejected, TaskState.canceled)
 
 class RemoteAgentConnections:
     """A class to hold the connections to the remote agents."""
 
-    def __init__(self, client: httpx.AsyncClient, agent_card: AgentCard):
+    def __init__(
+        self,
+        client: httpx.AsyncClient,
+        agent_card: AgentCard,
+        cache: ResponseCache | None = None,
+        resilience: ResilienceSettings | None = None,
+    ):
         self.agent_client = A2AClient(client, agent_card)
         self.card = agent_card
         self.pending_tasks = set()
-        self.timeout = 30.0
+        self.cache = cache
+        policy = (resilience or ResilienceSettings()).for_agent(agent_card.name)
+        # Answer latencies of this agent, they drive both the timeout and the hedging delay
+        self.latency = AdaptiveTimeout(
+            default=policy['timeout'],
+            factor=policy['timeout_factor'],
+            floor=policy['timeout_floor'],
+            ceiling=policy['timeout_ceiling'],
+            min_samples=policy['timeout_min_samples'],
+        )
+        self.breaker = CircuitBreaker(
+            failure_rate=policy['failure_rate'],
+            slow_call=policy['slow_call'],
+            window=policy['window'],
+            min_calls=policy['min_calls'],
+            open_time=policy['open_time'],
+        ) if policy['breaker'] else None
+        self.hedge = policy['hedge']
+        self.hedge_percentile = policy['hedge_percentile']
+        self.hedge_min_samples = policy['hedge_min_samples']
+        # Other connections that serve the same agent, hedged requests go there first
+        self.replicas: list['RemoteAgentConnections'] = []
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.cancel_requests = set()
+        self.cancelled = 0
+
+    @property
+    def timeout(self) -> float:
+        return self.latency.value
+
+    def record_timeout(self, elapsed: float):
+        """ Calls cut by a timeout are recorded at the elapsed time, so a too short timeout grows back """
+        self.latency.record(elapsed)
 
     def get_agent(self) -> AgentCard:
         return self.card
@@ -41,21 +96,32 @@ class RemoteAgentConnections:
     ) -> Task | Message | None:
         if self.card.capabilities.streaming:
             task = None
-            async for response in self.agent_client.send_message_streaming(
-                SendStreamingMessageRequest(id=str(uuid4()), params=request)
-            ):
-                if not response.root.result:
-                    return response.root.error
-                # In the case a message is returned, that is the end of the interaction.
-                event = response.root.result
-                if isinstance(event, Message):
-                    return event
-
-                # Otherwise we are in the Task + TaskUpdate cycle.
-                if task_callback and event:
-                    task = task_callback(event, self.card)
-                if hasattr(event, 'final') and event.final:
-                    break
+            final = False
+            try:
+                # The timeout applies between streamed events, not to the whole answer
+                async for response in self.agent_client.send_message_streaming(
+                    SendStreamingMessageRequest(id=str(uuid4()), params=request),
+                    http_kwargs={"timeout": self.timeout},
+                ):
+                    if isinstance(response.root, JSONRPCErrorResponse):
+                        return response.root.error
+                    # In the case a message is returned, that is the end of the interaction.
+                    event = response.root.result
+                    if isinstance(event, Message):
+                        return event
+
+                    # Otherwise we are in the Task + TaskUpdate cycle.
+                    task = self.apply_task_event(task, event)
+                    if task_callback and event:
+                        task_callback(event, self.card)
+                    if hasattr(event, 'final') and event.final:
+                        final = True
+                        break
+            except BaseException:
+                # Timed out or cancelled (a lost hedge), the agent stops generating an answer nobody reads
+                if task and not final:
+                    self.cancel_task(task.id)
+                raise
             return task
         # Non-streaming
         response = await self.agent_client.send_message(
@@ -70,7 +136,166 @@ class RemoteAgentConnections:
             task_callback(response.root.result, self.card)
         return response.root.result
     
-    async def send_message_agent(self, user_input:str)-> Any:
+    def cancel_task(self, task_id: str):
+        """ Sends tasks/cancel in the background, the caller may be cancelled already """
+        cancel = asyncio.create_task(self.send_cancel(task_id))
+        self.cancel_requests.add(cancel)
+        cancel.add_done_callback(self.cancel_requests.discard)
+
+    async def send_cancel(self, task_id: str):
+        try:
+            response = await self.agent_client.cancel_task(
+                CancelTaskRequest(id=str(uuid4()), params=TaskIdParams(id=task_id)),
+                # Cancellations free the host, they must not wait for a slot behind the stream they stop
+                http_kwargs={"timeout": self.latency.floor, "extensions": {"host_slot": False}},
+            )
+        except Exception as e:
+            logger.warning(f'Task {task_id} of {self.card.name} not cancelled: {e}')
+            return
+        if isinstance(response.root, JSONRPCErrorResponse):
+            logger.info(f'Task {task_id} of {self.card.name} not cancelled: {response.root.error.message}')
+            return
+        self.cancelled += 1
+
+    def apply_task_event(self, task: Task | None, event: TaskCallbackArg) -> Task | None:
+        """Folds a streamed event into the task snapshot kept for the request"""
+        if isinstance(event, Task):
+            return event
+        if task is None:
+            return None
+        if isinstance(event, TaskStatusUpdateEvent):
+            task.status = event.status
+        elif isinstance(event, TaskArtifactUpdateEvent):
+            append_artifact_to_task(task, event)
+        return task
+
+    def get_answer(self, result: Task | Message | Any) -> Any:
+        """Extracts the text answer of a streamed interaction"""
+        if isinstance(result, Message):
+            return get_message_text(result)
+        if isinstance(result, Task):
+            if result.status.state in FAILED_STATES:
+                reason = f": {get_message_text(result.status.message)}" if result.status.message else ""
+                return f"Error in response: task {result.id} ended in state {result.status.state.value}{reason}"
+            if result.artifacts:
+                return ''.join(get_text_parts(result.artifacts[-1].parts))
+            if result.status.message:
+                return get_message_text(result.status.message)
+            return f"Error in response: task {result.id} ended in state {result.status.state.value} without answer"
+        if result is None:
+            return "Error in response: the agent did not return a task"
+        return f"Error in response: {result.message}"
+
+    @staticmethod
+    def is_completed(result: Task | Message | Any) -> bool:
+        """ Only a completed task with an artifact holds a final answer, input_required texts are questions """
+        return isinstance(result, Task) and result.status.state == TaskState.completed and bool(result.artifacts)
+
+    async def send_message_agent(self, user_input:str, task_callback: TaskUpdateCallback | None = None)-> Any:
+        use_cache = self.cache is not None and self.cache.enabled_for(self.card)
+        if use_cache:
+            cached = self.cache.get(self.card, user_input)
+            if cached is not None:
+                return cached
+        if self.breaker and not self.breaker.allow():
+            return f"Error in response: {self.card.name} is failing, calls are paused for {self.breaker.retry_in():.0f}s"
+        started = time.perf_counter()
+        first_event: float | None = None
+
+        def on_event(event: TaskCallbackArg, card: AgentCard) -> Task | None:
+            # Slowness is measured to the first event, a long answer that keeps streaming is healthy
+            nonlocal first_event
+            if first_event is None:
+                first_event = time.perf_counter() - started
+            return task_callback(event, card) if task_callback else None
+
+        try:
+            answer, completed = await self.hedged_answer(user_input, on_event)
+        except BaseException as e:
+            # A cancelled call also counts as failed, else a half open breaker would wait for its trial forever
+            elapsed = time.perf_counter() - started
+            if self.breaker:
+                self.breaker.record(False, elapsed)
+            # The A2A client wraps httpx timeouts, streamed calls keep them as the cause
+            if isinstance(e, A2AClientTimeoutError) or isinstance(e.__cause__, httpx.TimeoutException):
+                self.record_timeout(elapsed)
+            raise
+        elapsed = time.perf_counter() - started
+        success = self.is_answer(answer)
+        if self.breaker:
+            self.breaker.record(success, elapsed if first_event is None else first_event)
+        if success:
+            self.latency.record(elapsed)
+        if use_cache and success and completed:
+            self.cache.put(self.card, user_input, answer)
+        return answer
+
+    @staticmethod
+    def is_answer(answer: Any) -> bool:
+        return isinstance(answer, str) and not answer.startswith("Error in response")
+
+    def hedge_delay(self) -> float | None:
+        """ The observed latency percentile once there are enough samples, None when hedging is off """
+        if not self.hedge or self.latency.histogram.total < self.hedge_min_samples:
+            return None
+        return self.latency.histogram.percentile(self.hedge_percentile)
+
+    def hedge_target(self) -> 'RemoteAgentConnections | None':
+        """ The least loaded healthy replica, None when the agent has no other replica to hedge on """
+        healthy = [replica for replica in self.replicas if not replica.breaker or replica.breaker.state == CircuitBreaker.CLOSED]
+        return min(healthy, key=lambda replica: len(replica.pending_tasks)) if healthy else None
+
+    async def hedged_answer(self, user_input:str, task_callback: TaskUpdateCallback | None = None) -> tuple[Any, bool]:
+        """ Sends a duplicate request when the first one is slower than the hedge delay, the first answer wins """
+        delay = self.hedge_delay()
+        if delay is None or not self.replicas:
+            return await self.request_answer(user_input, task_callback)
+        primary = asyncio.create_task(self.request_answer(user_input, task_callback))
+        pending = {primary}
+        try:
+            done, _ = await asyncio.wait(pending, timeout=delay)
+            if done:
+                return primary.result()
+            target = self.hedge_target()
+            if target is None:
+                return await primary
+            self.hedged += 1
+            # Only the primary request forwards progress, the duplicate runs quietly
+            hedge = asyncio.create_task(target.request_answer(user_input))
+            pending.add(hedge)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for finished in done:
+                    if finished.exception() is None and self.is_answer(finished.result()[0]):
+                        if finished is hedge:
+                            self.hedge_wins += 1
+                        return finished.result()
+            return await primary
+        finally:
+            # Requests of a cancelled caller or beaten by the other one must not keep loading the agent
+            for task in pending:
+                task.cancel()
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            'breaker': self.breaker.stats() if self.breaker else None,
+            'latency': self.latency.stats(),
+            'hedged': self.hedged,
+            'hedge_wins': self.hedge_wins,
+            'cancelled': self.cancelled,
+        }
+
+    async def request_answer(self, user_input:str, task_callback: TaskUpdateCallback | None = None)-> tuple[Any, bool]:
+        """ Sends one request, it counts in pending_tasks while it runs so replica sets see the load """
+        request_task = asyncio.current_task()
+        self.pending_tasks.add(request_task)
+        try:
+            return await self.send_request(user_input, task_callback)
+        finally:
+            self.pending_tasks.discard(request_task)
+
+    async def send_request(self, user_input:str, task_callback: TaskUpdateCallback | None = None)-> tuple[Any, bool]:
+        """ The answer text and whether it comes from a completed task, only those are cached """
         send_message_payload: dict[str, Any] = {
                 'message': {
                     'role': 'user',
@@ -80,41 +305,173 @@ class RemoteAgentConnections:
                     'message_id': uuid4().hex,
                 },
             }
+        if self.card.capabilities.streaming:
+            # Streamed answers are not bound to the blocking request timeout
+            result = await self.send_message_task(MessageSendParams(**send_message_payload), task_callback)
+            return self.get_answer(result), self.is_completed(result)
+        # A blocking caller only reads the final task, intermediate statuses are skipped on the server
+        send_message_payload['message']['metadata'] = {'status_updates': False}
         request = SendMessageRequest(
             id=str(uuid4()), params=MessageSendParams(**send_message_payload)
         )
         response = await self.agent_client.send_message(request, http_kwargs={"timeout": self.timeout})
-        final_text = response.model_dump(mode='json', exclude_none=True)
-        try:
-            answer = final_text.get("result").get("artifacts")[0].get('parts')[0].get('text')
-            return answer
-        except:
-            return final_text
-    
+        result = response.root.error if isinstance(response.root, JSONRPCErrorResponse) else response.root.result
+        return self.get_answer(result), self.is_completed(result)
+
+class ReplicaSet:
+    """ Connections to every replica of one agent name, each request goes to the replica picked by the strategy
+
+    round_robin rotates, least_outstanding takes the replica with fewer pending tasks and latency_weighted
+    picks at random weighted by 1 / (p50 latency x (1 + pending tasks)). Unhealthy replicas and open breakers are skipped.
+    """
+
+    STRATEGIES = ('round_robin', 'least_outstanding', 'latency_weighted')
+
+    def __init__(self, name: str, strategy: str = 'least_outstanding', is_healthy: Callable[[str], bool] | None = None):
+        if strategy not in self.STRATEGIES:
+            raise ValueError(f"Unknown balancing strategy {strategy}, use one of {', '.join(self.STRATEGIES)}")
+        self.name = name
+        self.strategy = strategy
+        self.is_healthy = is_healthy or (lambda address: True)
+        # address -> connection to the replica served there
+        self.replicas: dict[str, RemoteAgentConnections] = {}
+        self.turn = 0
+        self.picks: dict[str, int] = {}
+
+    @property
+    def card(self) -> AgentCard:
+        return next(reversed(self.replicas.values())).card
+
+    def add(self, address: str, connection: RemoteAgentConnections):
+        self.replicas[address] = connection
+        self.picks.setdefault(address, 0)
+        # Hedged requests of a replica go to its siblings
+        for replica in self.replicas.values():
+            replica.replicas = [other for other in self.replicas.values() if other is not replica]
+
+    def is_available(self) -> bool:
+        return any(self.is_healthy(address) for address in self.replicas)
+
+    def candidates(self) -> list[tuple[str, RemoteAgentConnections]]:
+        ready = [
+            (address, replica) for address, replica in self.replicas.items()
+            if self.is_healthy(address) and (not replica.breaker or replica.breaker.state != CircuitBreaker.OPEN)
+        ]
+        return ready or list(self.replicas.items())
+
+    def pick(self) -> RemoteAgentConnections:
+        candidates = self.candidates()
+        start = self.turn % len(candidates)
+        self.turn += 1
+        if len(candidates) == 1 or self.strategy == 'round_robin':
+            address, replica = candidates[start]
+        elif self.strategy == 'least_outstanding':
+            # Rotating the start spreads ties instead of always loading the first replica
+            rotated = candidates[start:] + candidates[:start]
+            address, replica = min(rotated, key=lambda candidate: len(candidate[1].pending_tasks))
+        else:
+            medians = [candidate[1].latency.histogram.percentile(50) for candidate in candidates]
+            known = [median for median in medians if median]
+            default = sum(known) / len(known) if known else 1.0
+            weights = [
+                1 / ((median or default) * (1 + len(candidate[1].pending_tasks)))
+                for median, candidate in zip(medians, candidates)
+            ]
+            address, replica = random.choices(candidates, weights)[0]
+        self.picks[address] += 1
+        return replica
+
+    async def send_message_agent(self, user_input: str, task_callback: TaskUpdateCallback | None = None) -> Any:
+        return await self.pick().send_message_agent(user_input, task_callback)
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            'strategy': self.strategy,
+            'replicas': {
+                address: {
+                    **replica.stats(),
+                    'healthy': self.is_healthy(address),
+                    'pending': len(replica.pending_tasks),
+                    'picks': self.picks[address],
+                }
+                for address, replica in self.replicas.items()
+            },
+        }
+
 async def main():
     ports = [9999,8888]
     host = 'localhost'
     servers:dict[str,RemoteAgentConnections] = {}
-    async with httpx.AsyncClient() as httpx_client:
-        for port in ports:
-            url=f"http://{host}:{port}/"
-        
-            resolver = A2ACardResolver(httpx_client,url)
+    cache = ResponseCache()
+    card_cache = AgentCardCache()
+    pool = HttpPoolManager()
+    urls = [f"http://{host}:{port}/" for port in ports]
+    await pool.warm_up(urls)
+    async with pool.client as httpx_client:
+        for url in urls:
             final_agent_card_use: AgentCard | None = None
 
             try:
-                _public_card = await resolver.get_agent_card()
+                _public_card, _ = await card_cache.fetch(httpx_client,url)
                 final_agent_card_use = _public_card
             except Exception as e:
                 raise RuntimeError('Failed to fetch the public agent card. Cannot continue.') from e
             name = str(final_agent_card_use.name)
-            agent = RemoteAgentConnections(httpx_client,final_agent_card_use)
+            agent = RemoteAgentConnections(httpx_client,final_agent_card_use,cache)
             servers[name] = agent
+        card_cache.save()
         response = await servers["Art agent"].send_message_agent("Who was nikola tesla?")
         print(response)
         response = await servers["Science agent"].send_message_agent("Who was nikola tesla?")
         print(response)
+        response = await servers["Science agent"].send_message_agent("who was  Nikola Tesla?")
+        print(response)
+        print(cache.stats())
+        print(pool.stats())
+
+class FakeReplica(RemoteAgentConnections):
+    """ Replica answering in service_time, at most concurrency requests at once like a server with a bounded LLM executor """
+
+    def __init__(self, client: httpx.AsyncClient, agent_card: AgentCard, service_time: float, concurrency: int):
+        super().__init__(client, agent_card)
+        self.service_time = service_time
+        self.slots = asyncio.Semaphore(concurrency)
+
+    async def send_request(self, user_input: str, task_callback: TaskUpdateCallback | None = None) -> tuple[Any, bool]:
+        async with self.slots:
+            await asyncio.sleep(self.service_time)
+            return 'ok', False
+
+async def benchmark(requests: int = 160, clients: int = 16, service_time: float = 0.05, concurrency: int = 2):
+    """ Throughput of every balancing strategy with 1, 2 and 4 fake replicas, then with one replica 4x slower
+
+    Every client sends its share of the requests one after the other, so the load follows the replica speed.
+    """
+    card = AgentCard(
+        name='Bench agent', description='Fake replica', url='http://localhost/', version='1.0.0',
+        default_input_modes=['text'], default_output_modes=['text'], capabilities=AgentCapabilities(), skills=[],
+    )
+    async with httpx.AsyncClient() as client:
+
+        async def run(replicas: int, strategy: str, slow_first: bool = False) -> tuple[float, dict[str, int]]:
+            replica_set = ReplicaSet(card.name, strategy)
+            for number in range(replicas):
+                slow = slow_first and number == 0
+                replica_set.add(f'replica-{number}', FakeReplica(client, card, service_time * (4 if slow else 1), concurrency))
+
+            async def client_loop():
+                for _ in range(requests // clients):
+                    await replica_set.send_message_agent('bench')
+
+            started = time.perf_counter()
+            await asyncio.gather(*[client_loop() for _ in range(clients)])
+            return requests / (time.perf_counter() - started), replica_set.picks
+
+        for strategy in ReplicaSet.STRATEGIES:
+            rates = [f'{(await run(replicas, strategy))[0]:7.1f}' for replicas in (1, 2, 4)]
+            rate, picks = await run(4, strategy, slow_first=True)
+            print(f"{strategy:18} req/s at 1/2/4 replicas: {' '.join(rates)} | slow first replica: {rate:7.1f} req/s picks {list(picks.values())}")
 
 if __name__ == '__main__':
-    import asyncio
-    asyncio.run(main())       
\ No newline at end of file
+    import asyncio, sys
+    asyncio.run(benchmark() if '--benchmark' in sys.argv else main())       
\ No newline at end of file